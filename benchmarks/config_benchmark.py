@@ -0,0 +1,34 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+"""Compare parsing the config file on every call with the cached `get_config()`.
+
+Run with `python -m benchmarks.config_benchmark` from the repository root.
+"""
+
+import os
+import timeit
+
+from brizo.config import Config
+from brizo.util import get_config
+
+# Number of `get_config()` calls made while serving a `/consume` request of one proxied file
+# with a signature, once the caches are warm: `RequestContext.config`, `web3()` through
+# `RequestContext.keeper`, `issue_session_token` and two in `build_download_response`.
+CALLS_PER_REQUEST = 5
+
+
+def main(number=2000):
+    config_file = os.getenv('CONFIG_FILE', 'config.ini')
+    parse_time = timeit.timeit(lambda: Config(filename=config_file), number=number) / number
+    get_config()
+    cached_time = timeit.timeit(get_config, number=number) / number
+
+    print(f'parse config file: {parse_time * 1e6:10.1f} us/call')
+    print(f'cached get_config: {cached_time * 1e6:10.1f} us/call')
+    print(f'saved per request: {(parse_time - cached_time) * CALLS_PER_REQUEST * 1e3:10.3f} ms '
+          f'({CALLS_PER_REQUEST} calls)')
+
+
+if __name__ == '__main__':
+    main()
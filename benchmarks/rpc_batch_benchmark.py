@@ -0,0 +1,191 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+"""Time the chain reads of one `/consume` authorization against a stand-in keeper node.
+
+`_read_agreement_authorization` sends them in two JSON-RPC batch requests, it is compared
+with the same reads through the keeper contract wrappers, one round trip each. The local
+node answers every HTTP request after `latency` seconds, which simulates the round trip to
+a remote keeper node. The agreement is in a recent block so its timestamp is not cached,
+and its actors come from a warm agreement index in both cases.
+
+Run with `python -m benchmarks.rpc_batch_benchmark` from the repository root, the contract
+ABIs are read from the keeper-contracts artifacts.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import sqlite3
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from eth_abi import encode_abi
+from ocean_keeper import Keeper
+from ocean_keeper.contract_handler import ContractHandler
+from ocean_keeper.web3_provider import Web3Provider
+from ocean_utils.agreements.service_types import ServiceTypes
+from ocean_utils.did import did_to_id, id_to_did
+
+from brizo.agreement_index import AgreementActorsIndex
+from brizo.util import (
+    _read_agreement_authorization,
+    get_agreement_actors,
+    get_agreement_actors_index,
+    get_config,
+    get_keeper_path
+)
+
+LATEST_BLOCK = 100
+AGREEMENT_ID = '0x' + '11' * 32
+DID_ID = '0x' + '22' * 32
+CONSUMER_ADDRESS = '0x00Bd138aBD70e2F00903268F3Db08f2D25677C9e'
+OWNER_ADDRESS = '0x068Ed00cF0441e4829D9784fCBe7b9e26D4BD8d0'
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    """`http.server.ThreadingHTTPServer` is only available from Python 3.7."""
+    daemon_threads = True
+
+
+def _get_fn_abi(contract, fn_name):
+    return next(item for item in contract.abi if item.get('name') == fn_name)
+
+
+def _encode_result(contract, fn_name, values):
+    fn_abi = _get_fn_abi(contract, fn_name)
+    output_types = [output['type'] for output in fn_abi['outputs']]
+    return '0x' + encode_abi(output_types, values).hex()
+
+
+def get_call_results(keeper):
+    """The results of the contract calls of the authorization, by function selector."""
+    agreement_manager = keeper.agreement_manager.contract
+    access_condition = keeper.access_secret_store_condition.contract
+    return {
+        _get_fn_abi(agreement_manager, 'getAgreement')['signature']: _encode_result(
+            agreement_manager, 'getAgreement', [
+                bytes.fromhex(DID_ID[2:]), OWNER_ADDRESS, bytes(32), [bytes(32)], OWNER_ADDRESS,
+                LATEST_BLOCK - 1
+            ]),
+        _get_fn_abi(access_condition, 'checkPermissions')['signature']: _encode_result(
+            access_condition, 'checkPermissions', [True]),
+    }
+
+
+def start_node(latency, call_results):
+    """Start a JSON-RPC node that knows one agreement, return the server and its counters.
+
+    :param call_results: results of the `eth_call`s by function selector, filled once the
+        contracts are loaded, dict
+    """
+    results = {
+        'net_version': '8996',
+        'eth_accounts': [],
+        'eth_blockNumber': hex(LATEST_BLOCK),
+        'eth_getBlockByNumber': {
+            'number': hex(LATEST_BLOCK - 1), 'hash': '0x' + '33' * 32, 'timestamp': '0x5e0be100'
+        },
+    }
+    counters = {'requests': 0, 'calls': 0}
+
+    def _result(call):
+        if call['method'] == 'eth_call':
+            return call_results[call['params'][0]['data'][:10]]
+        return results[call['method']]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            BaseHTTPRequestHandler.setup(self)
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            time.sleep(latency)
+            calls = request if isinstance(request, list) else [request]
+            counters['requests'] += 1
+            counters['calls'] += len(calls)
+            response = [
+                {'jsonrpc': '2.0', 'id': call['id'], 'result': _result(call)} for call in calls
+            ]
+            body = json.dumps(response if isinstance(request, list) else response[0]).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, counters
+
+
+def index_agreement_actor(keeper, index_path):
+    """Fill the agreement index as if it was synced up to the latest block."""
+    AgreementActorsIndex(index_path)
+    with sqlite3.connect(index_path) as conn:
+        conn.execute('INSERT OR IGNORE INTO agreement_actors VALUES (?, ?, ?)',
+                     (AGREEMENT_ID, CONSUMER_ADDRESS, LATEST_BLOCK - 1))
+        conn.execute('INSERT OR REPLACE INTO sync_state VALUES (?, ?)',
+                     (keeper.agreement_manager.address, LATEST_BLOCK))
+
+
+def read_sequentially(keeper, agreement_id, consumer_address, service_type, config):
+    """The reads of `_read_agreement_authorization` through the keeper wrappers."""
+    agreement = keeper.agreement_manager.get_agreement(agreement_id)
+    actors = get_agreement_actors(keeper, agreement_id)
+    is_authorized = consumer_address in actors and keeper.access_secret_store_condition.\
+        check_permissions(did_to_id(id_to_did(agreement.did)), consumer_address)
+    block = Web3Provider.get_web3().eth.getBlock(agreement.block_number_updated)
+    return agreement, bool(is_authorized), block.timestamp
+
+
+def main(latency=0.02, number=50):
+    call_results = dict()
+    server, counters = start_node(latency, call_results)
+    url = f'http://127.0.0.1:{server.server_port}'
+    index_path = os.path.join(tempfile.mkdtemp(), 'agreement_actors.db')
+    os.environ['KEEPER_URL'] = url
+    os.environ['AGREEMENT_INDEX_PATH'] = index_path
+    # The index is synced once at startup, the node does not know the actors events.
+    os.environ['AGREEMENT_INDEX_SYNC_INTERVAL'] = '3600'
+    os.environ.setdefault('KEEPER_NETWORK_NAME', 'development')
+
+    config = get_config()
+    Web3Provider.init_web3(url)
+    ContractHandler.set_artifacts_path(get_keeper_path(config))
+    keeper = Keeper.get_instance()
+    call_results.update(get_call_results(keeper))
+    index_agreement_actor(keeper, index_path)
+    get_agreement_actors_index()
+
+    args = (keeper, AGREEMENT_ID, CONSUMER_ADDRESS, ServiceTypes.ASSET_ACCESS, config)
+    try:
+        results = set()
+        for name, read in (('sequential', read_sequentially),
+                           ('batched', _read_agreement_authorization)):
+            _, is_authorized, block_time = read(*args)
+            results.add((is_authorized, block_time))
+            counters.update(requests=0, calls=0)
+            start = time.perf_counter()
+            for _ in range(number):
+                read(*args)
+            elapsed = (time.perf_counter() - start) / number
+            print(f'{name:>10}: {counters["requests"] / number:.0f} round trips, '
+                  f'{counters["calls"] / number:.0f} calls, {elapsed * 1e3:8.2f} ms per '
+                  f'authorization (node latency {latency * 1e3:.0f} ms)')
+        assert results == {(True, 0x5e0be100)}, results
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
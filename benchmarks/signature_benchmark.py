@@ -0,0 +1,52 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+"""Compare the signature operations of the secp256k1 backends on one core.
+
+`eth_account` is the path of `Keeper.sign_hash` and `Keeper.ec_recover`, the `native` and
+`coincurve` backends are the ones of `brizo.crypto.SignatureBackend`. The coincurve backend
+is skipped when the coincurve package is not installed.
+
+Run with `python -m benchmarks.signature_benchmark` from the repository root.
+"""
+
+import os
+import timeit
+
+from eth_account import Account
+from eth_keys.backends import is_coincurve_available
+
+from brizo.crypto import SignatureBackend, add_ethereum_prefix_and_hash
+
+MESSAGE = 'Ocean Protocol Authentication\n1568372035'
+
+
+def _report(name, operation, number):
+    seconds = timeit.timeit(operation, number=number)
+    print(f'{name:>24}: {number / seconds:10.1f} ops/s')
+
+
+def main(number=200):
+    private_key = os.urandom(32)
+    msg_hash = add_ethereum_prefix_and_hash(MESSAGE)
+    signature = Account.signHash(msg_hash, private_key).signature.hex()
+
+    _report('eth_account sign', lambda: Account.signHash(msg_hash, private_key), number)
+    _report('eth_account recover', lambda: Account.recoverHash(msg_hash, signature=signature),
+            number)
+
+    backends = ['native'] + (['coincurve'] if is_coincurve_available() else [])
+    for name in backends:
+        backend = SignatureBackend(name)
+        _report(f'{name} sign', lambda: backend.sign_hash(msg_hash, private_key), number)
+        _report(f'{name} recover', lambda: backend.recover_hash(msg_hash, signature), number)
+        items = [(msg_hash, signature, backend.recover_hash(msg_hash, signature))] * 10
+        seconds = timeit.timeit(lambda: backend.batch_verify(items), number=number // 10)
+        print(f'{name + " batch_verify":>24}: {number / seconds:10.1f} ops/s')
+
+    if not is_coincurve_available():
+        print('coincurve is not installed, `pip install coincurve` to compare it.')
+
+
+if __name__ == '__main__':
+    main()
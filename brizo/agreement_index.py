@@ -0,0 +1,189 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import logging
+import sqlite3
+import threading
+import time
+
+from ocean_keeper.event_filter import EventFilter
+from ocean_keeper.web3_provider import Web3Provider
+
+logger = logging.getLogger(__name__)
+
+
+class AgreementActorsIndex:
+    """Local SQLite index of the `AgreementActorAdded` events (agreementId -> actors).
+
+    The index is synced forward from the last indexed block by a background thread, so
+    looking up the actors of an agreement does not require scanning the chain logs from
+    block 0. Blocks that are not indexed yet (the most recent ones, or most of the chain
+    while the index is catching up) are covered by a scan filtered on the requested
+    agreement id, in ranges of `scan_chunk_blocks` blocks from the latest one back.
+    """
+
+    def __init__(self, db_path, from_block=0, confirmations=6, max_sync_blocks=10000,
+                 scan_chunk_blocks=10000):
+        """
+        :param db_path: path of the SQLite database file, str
+        :param from_block: block to start indexing from when the index is empty, int
+        :param confirmations: number of blocks behind `latest` to stop indexing at so that
+            the index does not keep events that can be reorganised out of the chain, int
+        :param max_sync_blocks: max number of blocks to index in one sync call, int
+        :param scan_chunk_blocks: number of blocks not indexed yet scanned per request on
+            lookup, int
+        """
+        self._db_path = db_path
+        self._from_block = from_block
+        self._confirmations = confirmations
+        self._max_sync_blocks = max_sync_blocks
+        self._scan_chunk_blocks = scan_chunk_blocks
+        self._lock = threading.Lock()
+        self._sync_thread = None
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS agreement_actors ('
+                'agreement_id TEXT NOT NULL, actor TEXT NOT NULL, block_number INTEGER NOT NULL, '
+                'PRIMARY KEY (agreement_id, actor))'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS sync_state ('
+                'contract_address TEXT PRIMARY KEY, last_block INTEGER NOT NULL)'
+            )
+
+    def start(self, keeper, interval):
+        """Sync the index in a background thread, every `interval` seconds once caught up.
+
+        :param keeper: Keeper instance
+        :param interval: seconds between two syncs, float
+        """
+        with self._lock:
+            if self._sync_thread is not None:
+                return
+            self._sync_thread = threading.Thread(
+                target=self._run, args=(keeper, interval), daemon=True)
+        self._sync_thread.start()
+
+    def get_actors(self, keeper, agreement_id, latest_block=None):
+        """Return the list of actor addresses added to the agreement `agreement_id`.
+
+        :param keeper: Keeper instance
+        :param agreement_id: id of the agreement, hex str
+        :param latest_block: number of the latest block if it is already known, int
+        :return: list of actor addresses, empty if the agreement has no actors
+        """
+        agreement_id = _normalize_agreement_id(agreement_id)
+        with self._lock:
+            actors = self._get_indexed_actors(agreement_id)
+            last_block = self._get_last_block(keeper.agreement_manager.address)
+        if actors:
+            return actors
+
+        if latest_block is None:
+            latest_block = Web3Provider.get_web3().eth.blockNumber
+        if last_block >= latest_block:
+            return actors
+
+        # The agreement may have been created in a block that is not indexed yet, the
+        # recent blocks are scanned first.
+        agreement_filter = {'agreementId': Web3Provider.get_web3().toBytes(hexstr=agreement_id)}
+        event = keeper.agreement_manager.get_event_filter_for_agreement_actor(None).event
+        to_block = latest_block
+        while to_block > last_block and not actors:
+            from_block = max(last_block + 1, to_block - self._scan_chunk_blocks + 1)
+            event_filter = EventFilter(
+                keeper.agreement_manager.AGREEMENT_ACTOR_ADDED_EVENT,
+                event,
+                agreement_filter,
+                from_block=from_block,
+                to_block=to_block
+            )
+            actors = [log.args.actor for log in event_filter.get_all_entries()]
+            to_block = from_block - 1
+        return actors
+
+    def sync(self, keeper, latest_block):
+        """Index the `AgreementActorAdded` events up to `latest_block - confirmations`.
+
+        At most `max_sync_blocks` blocks are indexed per call. The chain logs are read
+        without holding the lock, the lookups only wait for the write of the new rows.
+
+        :param keeper: Keeper instance
+        :param latest_block: number of the latest block, int
+        :return: number of the last indexed block, int
+        """
+        contract_address = keeper.agreement_manager.address
+        with self._lock:
+            last_block = self._get_last_block(contract_address, latest_block)
+        to_block = min(latest_block - self._confirmations, last_block + self._max_sync_blocks)
+        if to_block <= last_block:
+            return last_block
+
+        event_filter = keeper.agreement_manager.get_event_filter_for_agreement_actor(
+            None, from_block=last_block + 1, to_block=to_block)
+        event_logs = event_filter.get_all_entries()
+        rows = [
+            (
+                _normalize_agreement_id(Web3Provider.get_web3().toHex(log.args.agreementId)),
+                log.args.actor,
+                log.blockNumber
+            )
+            for log in event_logs
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO agreement_actors (agreement_id, actor, block_number) '
+                'VALUES (?, ?, ?)',
+                rows
+            )
+            self._conn.execute(
+                'INSERT OR REPLACE INTO sync_state (contract_address, last_block) VALUES (?, ?)',
+                (contract_address, to_block)
+            )
+
+        logger.debug(f'indexed {len(rows)} agreement actors from blocks '
+                     f'{last_block + 1} to {to_block}')
+        return to_block
+
+    def _run(self, keeper, interval):
+        while True:
+            try:
+                latest_block = Web3Provider.get_web3().eth.blockNumber
+                last_block = self.sync(keeper, latest_block)
+                if last_block < latest_block - self._confirmations:
+                    # Catching up, index the next blocks right away.
+                    continue
+            except Exception as e:
+                logger.warning(f'Failed to sync the agreement actors index: {e}')
+
+            time.sleep(interval)
+
+    def _get_last_block(self, contract_address, latest_block=None):
+        """Return the last indexed block, resetting the index if it is ahead of the chain."""
+        row = self._conn.execute(
+            'SELECT last_block FROM sync_state WHERE contract_address = ?',
+            (contract_address,)
+        ).fetchone()
+        if row and (latest_block is None or row[0] <= latest_block):
+            return row[0]
+        if latest_block is None:
+            return self._from_block - 1
+
+        # The contracts were (re)deployed or the chain was reset, drop the indexed events.
+        with self._conn:
+            self._conn.execute('DELETE FROM agreement_actors')
+            self._conn.execute('DELETE FROM sync_state')
+        return self._from_block - 1
+
+    def _get_indexed_actors(self, agreement_id):
+        rows = self._conn.execute(
+            'SELECT actor FROM agreement_actors WHERE agreement_id = ?',
+            (agreement_id,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+
+def _normalize_agreement_id(agreement_id):
+    return '0x' + Web3Provider.get_web3().toBytes(hexstr=agreement_id).hex()
@@ -0,0 +1,79 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import io
+import posixpath
+import time
+import zipfile
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """Unseekable file object keeping what is written until it is drained."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def get_member_name(name, index):
+    """Reduce `name` to a plain file name, safe to extract from the archive.
+
+    The names come from the urls and the `Content-Disposition` of the publisher, a name like
+    `../../.bashrc` would otherwise be extracted outside of the destination folder.
+
+    :param name: name of the file, str
+    :param index: position of the file in the archive, used when nothing is left of the name
+    :return: str
+    """
+    name = posixpath.basename((name or '').replace('\\', '/')).lstrip('. ')
+    return name or f'file-{index}'
+
+
+def stream_zip_archive(files):
+    """Yield a zip archive of `files` chunk by chunk, as the files are read.
+
+    The archive is written to an unseekable buffer, so the sizes and checksums of the members
+    are written after their data (data descriptors) and nothing is staged on disk. The
+    members are stored without compression and use zip64 since their size is not known
+    ahead.
+
+    :param files: iterable of tuples (name, chunks), `chunks` being an iterable of the bytes
+        of the file. It is iterated lazily, so each file is only opened when the previous
+        one has been sent. The names are reduced with `get_member_name`, duplicate names
+        are prefixed with the position of the file.
+    """
+    buffer = _ChunkBuffer()
+    names = set()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for i, (name, chunks) in enumerate(files):
+            name = get_member_name(name, i)
+            while name in names:
+                name = f'{i}-{name}'
+            names.add(name)
+
+            member = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            member.compress_type = zipfile.ZIP_STORED
+            try:
+                with archive.open(member, mode='w', force_zip64=True) as f:
+                    for chunk in chunks:
+                        f.write(chunk)
+                        data = buffer.drain()
+                        if data:
+                            yield data
+            finally:
+                if hasattr(chunks, 'close'):
+                    chunks.close()
+            yield buffer.drain()
+    yield buffer.drain()
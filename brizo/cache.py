@@ -0,0 +1,149 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.invalidated = False
+
+
+class TTLCache:
+    """Thread-safe LRU cache with a time to live per entry.
+
+    `get_or_load` coalesces concurrent misses on the same key so that the value is loaded
+    only once while the other callers wait for it (single-flight).
+    """
+
+    def __init__(self, maxsize, ttl):
+        """
+        :param maxsize: max number of entries, the least recently used entry is evicted
+            when the cache is full, int
+        :param ttl: default time to live of the entries in seconds, float
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._flights = dict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._get(key, default)
+
+    def set(self, key, value, ttl=None):
+        """
+        :param key: hashable key
+        :param value: value to cache
+        :param ttl: time to live of this entry in seconds, defaults to the cache ttl
+        """
+        with self._lock:
+            self._set(key, value, ttl)
+
+    def pop(self, key, default=None):
+        """Remove `key`, a value being loaded for `key` at the same time is not cached."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.invalidated = True
+            entry = self._entries.pop(key, None)
+            return entry[0] if entry else default
+
+    def clear(self):
+        with self._lock:
+            for flight in self._flights.values():
+                flight.invalidated = True
+            self._entries.clear()
+
+    def get_or_load(self, key, loader, ttl=None):
+        """Return the cached value of `key` or load it with `loader()` and cache it.
+
+        :param key: hashable key
+        :param loader: function without arguments returning the value to cache
+        :param ttl: time to live of the loaded value in seconds, or a function that gets the
+            loaded value and returns its time to live. Defaults to the cache ttl.
+        :return: the cached or loaded value
+        """
+        with self._lock:
+            value = self._get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._flights[key] = _Flight()
+
+        if not is_leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            entry_ttl = ttl(flight.value) if callable(ttl) else ttl
+            with self._lock:
+                if not flight.invalidated:
+                    self._set(key, flight.value, entry_ttl)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def _get(self, key, default):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def _set(self, key, value, ttl):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            self._entries.pop(key, None)
+            return
+
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
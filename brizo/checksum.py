@@ -0,0 +1,118 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Algorithm of a checksum without `checksumType`, by the number of its hex digits.
+CHECKSUM_ALGORITHMS_BY_LENGTH = {32: 'md5', 40: 'sha1', 64: 'sha256', 128: 'sha512'}
+
+
+class ChecksumMismatchError(Exception):
+    """The content of a file does not match the checksum or length of its metadata."""
+
+
+def get_checksum_algorithm(checksum, checksum_type=None):
+    """Return the name of the `hashlib` algorithm of a file checksum, or None if unknown.
+
+    :param checksum: hex digest of the file, str
+    :param checksum_type: `checksumType` of the file metadata, e.g. `MD5`, str
+    :return: str
+    """
+    if checksum_type:
+        name = checksum_type.lower().replace('-', '')
+        return name if name in hashlib.algorithms_available else None
+
+    checksum = checksum.lower()
+    if checksum.startswith('0x'):
+        checksum = checksum[2:]
+    return CHECKSUM_ALGORITHMS_BY_LENGTH.get(len(checksum))
+
+
+class ChecksumStats:
+    """Counters of the downloads verified against the checksums of the asset metadata."""
+
+    def __init__(self):
+        self.verified = 0
+        self.mismatched = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def record(self, result):
+        with self._lock:
+            setattr(self, result, getattr(self, result) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'verified': self.verified,
+                'mismatched': self.mismatched,
+                'skipped': self.skipped
+            }
+
+
+def verify_content(chunks, file_attributes, description, stats=None):
+    """Yield the `chunks` of a file while hashing them, and check the file against the
+    `checksum` and `contentLength` of its metadata once all were read.
+
+    Only the last chunk is held back until the file was checked. A mismatch is logged and
+    raises a `ChecksumMismatchError` instead of yielding it, so the response ends short of
+    its `Content-Length` and the file is not stored in the content cache. Files without a
+    known checksum are only checked against their length, if any.
+
+    :param chunks: iterable of bytes
+    :param file_attributes: the file entry of `metadata.main.files` of the DDO, dict
+    :param description: identifies the file in the logs, str
+    :param stats: ChecksumStats instance
+    """
+    expected_checksum = (file_attributes.get('checksum') or '').lower()
+    if expected_checksum.startswith('0x'):
+        expected_checksum = expected_checksum[2:]
+    algorithm = None
+    if expected_checksum:
+        algorithm = get_checksum_algorithm(expected_checksum, file_attributes.get('checksumType'))
+    try:
+        expected_length = int(file_attributes.get('contentLength'))
+    except (TypeError, ValueError):
+        expected_length = None
+
+    if algorithm is None and expected_length is None:
+        if stats:
+            stats.record('skipped')
+        yield from chunks
+        return
+
+    hasher = hashlib.new(algorithm) if algorithm else None
+    length = 0
+    last_chunk = None
+    try:
+        for chunk in chunks:
+            if hasher:
+                hasher.update(chunk)
+            length += len(chunk)
+            if last_chunk is not None:
+                yield last_chunk
+            last_chunk = chunk
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+    errors = []
+    if expected_length is not None and length != expected_length:
+        errors.append(f'length {length} instead of {expected_length}')
+    if hasher and hasher.hexdigest() != expected_checksum:
+        errors.append(f'{algorithm} {hasher.hexdigest()} instead of {expected_checksum}')
+
+    if stats:
+        stats.record('mismatched' if errors else 'verified')
+    if errors:
+        msg = f'Content of {description} does not match its metadata: {", ".join(errors)}.'
+        logger.error(msg)
+        raise ChecksumMismatchError(msg)
+
+    logger.debug(f'Verified {length} bytes of {description}.')
+    if last_chunk is not None:
+        yield last_chunk
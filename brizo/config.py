@@ -12,11 +12,50 @@ NAME_KEEPER_URL = 'keeper.url'
 NAME_KEEPER_PATH = 'keeper.path'
 NAME_AUTH_TOKEN_MESSAGE = 'auth_token_message'
 NAME_AUTH_TOKEN_EXPIRATION = 'auth_token_expiration'
+NAME_AUTH_TOKEN_CACHE_SIZE = 'auth_token_cache.size'
+NAME_SIGNATURE_BACKEND = 'signature.backend'
+NAME_PROVIDER_KEY_UNLOCK = 'provider_key.unlock'
+NAME_SESSION_TOKEN_TTL = 'session_token.ttl'
+NAME_SESSION_TOKEN_SECRET = 'session_token.secret'
+NAME_COMPUTE_STATUS_INTERVAL = 'compute_status.interval'
+NAME_COMPUTE_STATUS_MAX_WAIT = 'compute_status.max_wait'
+NAME_COMPUTE_STATUS_IDLE_TIMEOUT = 'compute_status.idle_timeout'
+NAME_COMPUTE_STATUS_MAX_WATCHERS = 'compute_status.max_watchers'
+NAME_COMPUTE_STATUS_MAX_WATCHERS_PER_OWNER = 'compute_status.max_watchers_per_owner'
 
 NAME_AQUARIUS_URL = 'aquarius.url'
 NAME_SECRET_STORE_URL = 'secret_store.url'
 NAME_PARITY_URL = 'parity.url'
 NAME_OPERATOR_SERVICE_URL = 'operator_service.url'
+NAME_AGREEMENT_INDEX_PATH = 'agreement_index.path'
+NAME_AGREEMENT_INDEX_FROM_BLOCK = 'agreement_index.from_block'
+NAME_AGREEMENT_INDEX_SYNC_INTERVAL = 'agreement_index.sync_interval'
+NAME_AGREEMENT_INDEX_SCAN_CHUNK_BLOCKS = 'agreement_index.scan_chunk_blocks'
+NAME_DOWNLOAD_CHUNK_SIZE = 'download.chunk_size'
+NAME_DDO_CACHE_SIZE = 'ddo_cache.size'
+NAME_DDO_CACHE_TTL = 'ddo_cache.ttl'
+NAME_SECRET_STORE_POOL_SIZE = 'secret_store.pool_size'
+NAME_SECRET_STORE_POOL_TIMEOUT = 'secret_store.pool_timeout'
+NAME_BLOCK_CONFIRMATIONS = 'block_confirmations'
+NAME_FILES_CACHE_SIZE = 'files_cache.size'
+NAME_FILES_CACHE_TTL = 'files_cache.ttl'
+NAME_FILES_CACHE_ENCRYPT = 'files_cache.encrypt'
+NAME_AUTHORIZATION_CACHE_SIZE = 'authorization_cache.size'
+NAME_AUTHORIZATION_CACHE_MAX_TTL = 'authorization_cache.max_ttl'
+NAME_AUTHORIZATION_CACHE_NEGATIVE_TTL = 'authorization_cache.negative_ttl'
+NAME_OSMOSIS_WARM_UP_DRIVERS = 'osmosis_drivers.warm_up'
+NAME_SIGNED_URL_CACHE_SIZE = 'signed_url_cache.size'
+NAME_SIGNED_URL_CACHE_MARGIN = 'signed_url_cache.margin'
+NAME_DOWNLOAD_URLS_CONCURRENCY = 'download_urls.concurrency'
+NAME_CONSUME_REDIRECT = 'consume.redirect'
+NAME_CONSUME_REDIRECT_MAX_TTL = 'consume.redirect_max_ttl'
+NAME_CONSUME_VERIFY_CHECKSUM = 'consume.verify_checksum'
+NAME_CONTENT_CACHE_PATH = 'content_cache.path'
+NAME_CONTENT_CACHE_MAX_BYTES = 'content_cache.max_bytes'
+NAME_LOCAL_FILES_ROOTS = 'local_files.roots'
+NAME_SEGMENTED_DOWNLOAD_THRESHOLD = 'segmented_download.threshold'
+NAME_SEGMENTED_DOWNLOAD_PARALLELISM = 'segmented_download.parallelism'
+NAME_SEGMENTED_DOWNLOAD_SEGMENT_SIZE = 'segmented_download.segment_size'
 
 environ_names = {
     NAME_KEEPER_URL: ['KEEPER_URL', 'Keeper URL', 'keeper-contracts'],
@@ -25,10 +64,110 @@ environ_names = {
                               'Message to use for generating user auth token', 'resources'],
     NAME_AUTH_TOKEN_EXPIRATION: ['AUTH_TOKEN_EXPIRATION',
                                  'Auth token expiration time expressed in seconds', 'resources'],
+    NAME_AUTH_TOKEN_CACHE_SIZE: ['AUTH_TOKEN_CACHE_SIZE',
+                                 'Max number of auth tokens with a cached signer address',
+                                 'resources'],
+    NAME_SIGNATURE_BACKEND: ['SIGNATURE_BACKEND',
+                             'secp256k1 backend of the signatures, auto, coincurve or native',
+                             'resources'],
+    NAME_PROVIDER_KEY_UNLOCK: ['PROVIDER_KEY_UNLOCK',
+                               'Decrypt the provider key once at startup instead of per signature',
+                               'resources'],
+    NAME_SESSION_TOKEN_TTL: ['SESSION_TOKEN_TTL',
+                             'Time to live of the consume session tokens in seconds', 'resources'],
+    NAME_SESSION_TOKEN_SECRET: ['SESSION_TOKEN_SECRET',
+                                'HMAC key of the consume session tokens', 'resources'],
+    NAME_COMPUTE_STATUS_INTERVAL: ['COMPUTE_STATUS_INTERVAL',
+                                   'Seconds between two requests of the status of a watched '
+                                   'compute job', 'resources'],
+    NAME_COMPUTE_STATUS_MAX_WAIT: ['COMPUTE_STATUS_MAX_WAIT',
+                                   'Max seconds a compute status request waits for a change',
+                                   'resources'],
+    NAME_COMPUTE_STATUS_IDLE_TIMEOUT: ['COMPUTE_STATUS_IDLE_TIMEOUT',
+                                       'Seconds a compute job is watched after its last status '
+                                       'request', 'resources'],
+    NAME_COMPUTE_STATUS_MAX_WATCHERS: ['COMPUTE_STATUS_MAX_WATCHERS',
+                                       'Max number of compute jobs watched at the same time',
+                                       'resources'],
+    NAME_COMPUTE_STATUS_MAX_WATCHERS_PER_OWNER: ['COMPUTE_STATUS_MAX_WATCHERS_PER_OWNER',
+                                                 'Max number of compute jobs of one consumer '
+                                                 'watched at the same time', 'resources'],
     NAME_SECRET_STORE_URL: ['SECRET_STORE_URL', 'Secret Store URL', 'keeper-contracts'],
     NAME_AQUARIUS_URL: ['AQUARIUS_URL', 'Aquarius url (metadata store)', 'resources'],
     NAME_PARITY_URL: ['PARITY_URL', 'Parity URL', 'keeper-contracts'],
+    NAME_SECRET_STORE_POOL_SIZE: ['SECRET_STORE_POOL_SIZE',
+                                  'Max number of SecretStore clients per worker', 'keeper-contracts'],
+    NAME_SECRET_STORE_POOL_TIMEOUT: ['SECRET_STORE_POOL_TIMEOUT',
+                                     'Max seconds to wait for a SecretStore client', 'keeper-contracts'],
     NAME_OPERATOR_SERVICE_URL: ['OPERATOR_SERVICE_URL', 'Operator service URL', 'resources'],
+    NAME_AGREEMENT_INDEX_PATH: ['AGREEMENT_INDEX_PATH',
+                                'Path of the agreement actors index database', 'resources'],
+    NAME_AGREEMENT_INDEX_FROM_BLOCK: ['AGREEMENT_INDEX_FROM_BLOCK',
+                                      'Block to start indexing agreement actors from', 'resources'],
+    NAME_AGREEMENT_INDEX_SYNC_INTERVAL: ['AGREEMENT_INDEX_SYNC_INTERVAL',
+                                         'Seconds between two syncs of the agreement actors '
+                                         'index', 'resources'],
+    NAME_AGREEMENT_INDEX_SCAN_CHUNK_BLOCKS: ['AGREEMENT_INDEX_SCAN_CHUNK_BLOCKS',
+                                             'Number of blocks not indexed yet scanned per '
+                                             'request for the actors of an agreement',
+                                             'resources'],
+    NAME_DOWNLOAD_CHUNK_SIZE: ['DOWNLOAD_CHUNK_SIZE',
+                               'Size in bytes of the chunks streamed to the consumer', 'resources'],
+    NAME_DDO_CACHE_SIZE: ['DDO_CACHE_SIZE', 'Max number of cached DDOs', 'resources'],
+    NAME_DDO_CACHE_TTL: ['DDO_CACHE_TTL', 'Time to live of the cached DDOs in seconds', 'resources'],
+    NAME_BLOCK_CONFIRMATIONS: ['BLOCK_CONFIRMATIONS',
+                               'Number of blocks after which a block is considered final',
+                               'keeper-contracts'],
+    NAME_FILES_CACHE_SIZE: ['FILES_CACHE_SIZE', 'Max number of cached decrypted files lists',
+                            'resources'],
+    NAME_FILES_CACHE_TTL: ['FILES_CACHE_TTL',
+                           'Time to live of the cached decrypted files lists in seconds', 'resources'],
+    NAME_FILES_CACHE_ENCRYPT: ['FILES_CACHE_ENCRYPT',
+                               'Keep the cached decrypted files lists encrypted in memory', 'resources'],
+    NAME_AUTHORIZATION_CACHE_SIZE: ['AUTHORIZATION_CACHE_SIZE',
+                                    'Max number of cached authorization decisions', 'resources'],
+    NAME_AUTHORIZATION_CACHE_MAX_TTL: ['AUTHORIZATION_CACHE_MAX_TTL',
+                                       'Max time to live of the cached granted authorizations '
+                                       'in seconds', 'resources'],
+    NAME_AUTHORIZATION_CACHE_NEGATIVE_TTL: ['AUTHORIZATION_CACHE_NEGATIVE_TTL',
+                                            'Time to live of the cached denied authorizations '
+                                            'in seconds', 'resources'],
+    NAME_OSMOSIS_WARM_UP_DRIVERS: ['OSMOSIS_WARM_UP_DRIVERS',
+                                   'Comma separated Osmosis drivers to initialize at startup',
+                                   'resources'],
+    NAME_SIGNED_URL_CACHE_SIZE: ['SIGNED_URL_CACHE_SIZE', 'Max number of cached signed urls',
+                                 'resources'],
+    NAME_SIGNED_URL_CACHE_MARGIN: ['SIGNED_URL_CACHE_MARGIN',
+                                   'Seconds before their expiry when the signed urls are dropped',
+                                   'resources'],
+    NAME_DOWNLOAD_URLS_CONCURRENCY: ['DOWNLOAD_URLS_CONCURRENCY',
+                                     'Max number of download urls of an asset generated in parallel',
+                                     'resources'],
+    NAME_CONSUME_REDIRECT: ['CONSUME_REDIRECT',
+                            'Redirect consumers to the pre-signed urls instead of proxying the files',
+                            'resources'],
+    NAME_CONSUME_REDIRECT_MAX_TTL: ['CONSUME_REDIRECT_MAX_TTL',
+                                    'Max remaining lifetime in seconds of a pre-signed url a '
+                                    'consumer is redirected to', 'resources'],
+    NAME_CONSUME_VERIFY_CHECKSUM: ['CONSUME_VERIFY_CHECKSUM',
+                                   'Verify the downloaded files against the checksums of the DDO',
+                                   'resources'],
+    NAME_CONTENT_CACHE_PATH: ['CONTENT_CACHE_PATH', 'Directory of the cached asset files',
+                              'resources'],
+    NAME_CONTENT_CACHE_MAX_BYTES: ['CONTENT_CACHE_MAX_BYTES',
+                                   'Max total size of the cached asset files in bytes', 'resources'],
+    NAME_LOCAL_FILES_ROOTS: ['LOCAL_FILES_ROOTS',
+                             'Comma separated directories local asset files can be served from',
+                             'resources'],
+    NAME_SEGMENTED_DOWNLOAD_THRESHOLD: ['SEGMENTED_DOWNLOAD_THRESHOLD',
+                                        'Min size in bytes of the files downloaded in parallel '
+                                        'segments', 'resources'],
+    NAME_SEGMENTED_DOWNLOAD_PARALLELISM: ['SEGMENTED_DOWNLOAD_PARALLELISM',
+                                          'Max number of segments of a file downloaded in '
+                                          'parallel', 'resources'],
+    NAME_SEGMENTED_DOWNLOAD_SEGMENT_SIZE: ['SEGMENTED_DOWNLOAD_SEGMENT_SIZE',
+                                           'Size in bytes of the segments of a file downloaded '
+                                           'in parallel', 'resources'],
 }
 
 
@@ -56,6 +195,7 @@ class Config(configparser.ConfigParser):
         """
         configparser.ConfigParser.__init__(self)
 
+        self._frozen = False
         self._section_name = 'keeper-contracts'
         self._logger = logging.getLogger('config')
 
@@ -74,6 +214,42 @@ class Config(configparser.ConfigParser):
 
         self._load_environ()
 
+    def freeze(self):
+        """Make this config read-only so that a single instance can be shared safely."""
+        self._frozen = True
+
+    def set(self, section, option, value=None):
+        self._check_not_frozen()
+        configparser.ConfigParser.set(self, section, option, value)
+
+    def add_section(self, section):
+        self._check_not_frozen()
+        configparser.ConfigParser.add_section(self, section)
+
+    def remove_option(self, section, option):
+        self._check_not_frozen()
+        return configparser.ConfigParser.remove_option(self, section, option)
+
+    def remove_section(self, section):
+        self._check_not_frozen()
+        return configparser.ConfigParser.remove_section(self, section)
+
+    def _check_not_frozen(self):
+        if self._frozen:
+            raise TypeError('This config is read-only, create a new `Config` to change settings.')
+
+    def _get_int(self, option, default, section='resources'):
+        """Get an int option, empty values fall back to `default`."""
+        value = self.get(section, option, fallback=None)
+        return int(value) if value not in (None, '') else default
+
+    def _get_bool(self, option, default, section='resources'):
+        """Get a bool option, empty values fall back to `default`."""
+        value = self.get(section, option, fallback=None)
+        if value in (None, ''):
+            return default
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
     def _load_environ(self):
         for option_name, environ_item in environ_names.items():
             value = os.environ.get(environ_item[0])
@@ -106,6 +282,21 @@ class Config(configparser.ConfigParser):
         """URL of parity client. (e.g.): http://myparity:8545."""
         return self.get(self._section_name, NAME_PARITY_URL, fallback=None)
 
+    @property
+    def secret_store_pool_size(self):
+        """Max number of SecretStore clients, and concurrent SecretStore calls, per worker."""
+        return self._get_int(NAME_SECRET_STORE_POOL_SIZE, 4, section=self._section_name)
+
+    @property
+    def secret_store_pool_timeout(self):
+        """Max number of seconds to wait for a SecretStore client of the pool."""
+        return self._get_int(NAME_SECRET_STORE_POOL_TIMEOUT, 30, section=self._section_name)
+
+    @property
+    def block_confirmations(self):
+        """Number of confirmations after which a block is considered final and can be cached."""
+        return self._get_int(NAME_BLOCK_CONFIRMATIONS, 6, section=self._section_name)
+
     @property
     def operator_service_url(self):
         """URL of the operator service component. (e.g.): http://myoperatorservice:8050."""
@@ -118,3 +309,185 @@ class Config(configparser.ConfigParser):
     @property
     def auth_token_expiration(self):
         return self.get('resources', NAME_AUTH_TOKEN_EXPIRATION, fallback=None)
+
+    @property
+    def auth_token_cache_size(self):
+        """Max number of auth tokens with a cached signer address, 0 disables the cache."""
+        return self._get_int(NAME_AUTH_TOKEN_CACHE_SIZE, 10000)
+
+    @property
+    def signature_backend(self):
+        """secp256k1 implementation used to sign and recover signatures."""
+        return self.get('resources', NAME_SIGNATURE_BACKEND, fallback='auto') or 'auto'
+
+    @property
+    def provider_key_unlock(self):
+        """Whether the encrypted provider key is decrypted once at startup."""
+        return self._get_bool(NAME_PROVIDER_KEY_UNLOCK, True)
+
+    @property
+    def session_token_ttl(self):
+        """Time to live of the consume session tokens in seconds, 0 disables them."""
+        return self._get_int(NAME_SESSION_TOKEN_TTL, 0)
+
+    @property
+    def session_token_secret(self):
+        """HMAC key of the session tokens, required when they are enabled."""
+        return self.get('resources', NAME_SESSION_TOKEN_SECRET, fallback=None) or None
+
+    @property
+    def compute_status_interval(self):
+        """Seconds between two requests of the status of a watched compute job."""
+        return self._get_int(NAME_COMPUTE_STATUS_INTERVAL, 2)
+
+    @property
+    def compute_status_max_wait(self):
+        """Max seconds a request of `/compute/status` waits for a change of the status."""
+        return self._get_int(NAME_COMPUTE_STATUS_MAX_WAIT, 30)
+
+    @property
+    def compute_status_idle_timeout(self):
+        """Seconds a compute job is watched after its last status request."""
+        return self._get_int(NAME_COMPUTE_STATUS_IDLE_TIMEOUT, 60)
+
+    @property
+    def compute_status_max_watchers(self):
+        """Max number of compute jobs watched at the same time by a process."""
+        return self._get_int(NAME_COMPUTE_STATUS_MAX_WATCHERS, 1000)
+
+    @property
+    def compute_status_max_watchers_per_owner(self):
+        """Max number of compute jobs of one consumer watched at the same time."""
+        return self._get_int(NAME_COMPUTE_STATUS_MAX_WATCHERS_PER_OWNER, 10)
+
+    @property
+    def agreement_index_path(self):
+        """Path of the SQLite index of agreement actors, the index is disabled if not set."""
+        return self.get('resources', NAME_AGREEMENT_INDEX_PATH, fallback=None) or None
+
+    @property
+    def agreement_index_from_block(self):
+        """Block to start indexing from, typically the keeper-contracts deployment block."""
+        return self._get_int(NAME_AGREEMENT_INDEX_FROM_BLOCK, 0)
+
+    @property
+    def agreement_index_sync_interval(self):
+        """Seconds between two syncs of the agreement actors index once it caught up."""
+        return self._get_int(NAME_AGREEMENT_INDEX_SYNC_INTERVAL, 10)
+
+    @property
+    def agreement_index_scan_chunk_blocks(self):
+        """Number of blocks not indexed yet scanned per request on the lookup of an agreement."""
+        return self._get_int(NAME_AGREEMENT_INDEX_SCAN_CHUNK_BLOCKS, 10000)
+
+    @property
+    def download_chunk_size(self):
+        """Size in bytes of the chunks streamed from the asset url to the consumer."""
+        return self._get_int(NAME_DOWNLOAD_CHUNK_SIZE, 64 * 1024)
+
+    @property
+    def ddo_cache_size(self):
+        """Max number of resolved DDOs kept in memory, 0 disables the DDO cache."""
+        return self._get_int(NAME_DDO_CACHE_SIZE, 1000)
+
+    @property
+    def ddo_cache_ttl(self):
+        """Time to live of a cached DDO in seconds."""
+        return self._get_int(NAME_DDO_CACHE_TTL, 300)
+
+    @property
+    def files_cache_size(self):
+        """Max number of decrypted asset files lists kept in memory, 0 disables the cache."""
+        return self._get_int(NAME_FILES_CACHE_SIZE, 1000)
+
+    @property
+    def files_cache_ttl(self):
+        """Time to live of a cached decrypted files list in seconds."""
+        return self._get_int(NAME_FILES_CACHE_TTL, 600)
+
+    @property
+    def files_cache_encrypt(self):
+        """Whether the cached decrypted files lists are kept encrypted in memory."""
+        return self._get_bool(NAME_FILES_CACHE_ENCRYPT, True)
+
+    @property
+    def authorization_cache_size(self):
+        """Max number of authorization decisions kept in memory, 0 disables the cache."""
+        return self._get_int(NAME_AUTHORIZATION_CACHE_SIZE, 10000)
+
+    @property
+    def authorization_cache_max_ttl(self):
+        """Max time to live in seconds of a granted authorization."""
+        return self._get_int(NAME_AUTHORIZATION_CACHE_MAX_TTL, 24 * 3600)
+
+    @property
+    def authorization_cache_negative_ttl(self):
+        """Time to live in seconds of a denied authorization."""
+        return self._get_int(NAME_AUTHORIZATION_CACHE_NEGATIVE_TTL, 5)
+
+    @property
+    def osmosis_warm_up_drivers(self):
+        """List of the Osmosis drivers initialized at startup."""
+        value = self.get('resources', NAME_OSMOSIS_WARM_UP_DRIVERS, fallback='on_premise,ipfs')
+        return [driver.strip() for driver in value.split(',') if driver.strip()]
+
+    @property
+    def signed_url_cache_size(self):
+        """Max number of pre-signed download urls kept in memory, 0 disables the cache."""
+        return self._get_int(NAME_SIGNED_URL_CACHE_SIZE, 1000)
+
+    @property
+    def signed_url_cache_margin(self):
+        """Number of seconds before its expiry when a cached signed url is dropped."""
+        return self._get_int(NAME_SIGNED_URL_CACHE_MARGIN, 3600)
+
+    @property
+    def download_urls_concurrency(self):
+        """Max number of download urls of a multi-file asset generated in parallel."""
+        return self._get_int(NAME_DOWNLOAD_URLS_CONCURRENCY, 8)
+
+    @property
+    def consume_redirect(self):
+        """Whether `consume` redirects to the pre-signed urls of the files by default."""
+        return self._get_bool(NAME_CONSUME_REDIRECT, False)
+
+    @property
+    def consume_redirect_max_ttl(self):
+        """Max remaining lifetime in seconds of the pre-signed urls handed out in a redirect."""
+        return self._get_int(NAME_CONSUME_REDIRECT_MAX_TTL, 24 * 3600)
+
+    @property
+    def consume_verify_checksum(self):
+        """Whether `consume` verifies the files against the checksums of the asset metadata."""
+        return self._get_bool(NAME_CONSUME_VERIFY_CHECKSUM, False)
+
+    @property
+    def content_cache_path(self):
+        """Directory of the local cache of downloaded asset files, empty disables the cache."""
+        return self.get('resources', NAME_CONTENT_CACHE_PATH, fallback=None) or None
+
+    @property
+    def content_cache_max_bytes(self):
+        """Max total size in bytes of the cached asset files."""
+        return self._get_int(NAME_CONTENT_CACHE_MAX_BYTES, 1024 ** 3)
+
+    @property
+    def local_files_roots(self):
+        """List of the directories asset files can be served from directly, e.g. NFS mounts."""
+        value = self.get('resources', NAME_LOCAL_FILES_ROOTS, fallback='')
+        return [root.strip() for root in value.split(',') if root.strip()]
+
+    @property
+    def segmented_download_threshold(self):
+        """Min size in bytes of the files downloaded in parallel segments, 0 disables it."""
+        return self._get_int(NAME_SEGMENTED_DOWNLOAD_THRESHOLD, 0)
+
+    @property
+    def segmented_download_parallelism(self):
+        """Max number of segments of a file downloaded in parallel."""
+        return self._get_int(NAME_SEGMENTED_DOWNLOAD_PARALLELISM, 4)
+
+    @property
+    def segmented_download_segment_size(self):
+        """Size in bytes of the segments of a file downloaded in parallel."""
+        return self._get_int(NAME_SEGMENTED_DOWNLOAD_SEGMENT_SIZE, 8 * 1024 ** 2)
@@ -0,0 +1,222 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CachedContent:
+    """A file of the content cache with the upstream metadata it was downloaded with."""
+
+    def __init__(self, path, metadata):
+        self.path = path
+        self.metadata = metadata
+
+    @property
+    def size(self):
+        return self.metadata.get('size')
+
+    @property
+    def content_type(self):
+        return self.metadata.get('content_type')
+
+    @property
+    def filename(self):
+        return self.metadata.get('filename')
+
+    def validation_headers(self):
+        """Headers of a conditional upstream request that succeeds only if the content changed."""
+        headers = dict()
+        if self.metadata.get('etag'):
+            headers['If-None-Match'] = self.metadata['etag']
+        if self.metadata.get('last_modified'):
+            headers['If-Modified-Since'] = self.metadata['last_modified']
+        return headers
+
+
+class ContentCache:
+    """LRU cache of asset files on the local disk, keyed by the source url of the file.
+
+    Only files served by an upstream that sends an `ETag` or a `Last-Modified` header are
+    cached, a cached file is revalidated with a conditional request before it is served.
+    The least recently used files are removed when the total size of the cache exceeds
+    `max_bytes`.
+    """
+
+    METADATA_SUFFIX = '.json'
+    TEMP_SUFFIX = '.tmp'
+
+    def __init__(self, directory, max_bytes):
+        """
+        :param directory: directory of the cached files, str
+        :param max_bytes: max total size of the cached files in bytes, int
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._remove_temp_files()
+
+    def stats(self):
+        with self._lock:
+            entries = self._list_entries()
+            return {
+                'files': len(entries),
+                'bytes': sum(size for _, size, _ in entries),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def get(self, url):
+        """Return the cached content of `url`, or None.
+
+        :param url: source url of the file, str
+        :return: CachedContent instance
+        """
+        data_path, metadata_path = self._get_paths(url)
+        try:
+            with open(metadata_path) as f:
+                metadata = json.load(f)
+            if os.path.getsize(data_path) != metadata.get('size'):
+                raise ValueError(f'size of {data_path} does not match its metadata.')
+            # the mtime of the file is its last access time for the LRU eviction
+            os.utime(data_path)
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f'Invalid content cache entry of {url}: {e}')
+                self.remove(url)
+            return None
+
+        return CachedContent(data_path, metadata)
+
+    def remove(self, url):
+        for path in self._get_paths(url):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def record_hit(self, is_hit):
+        with self._lock:
+            if is_hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def can_cache(self, headers):
+        """Whether a response with these headers can be cached.
+
+        :param headers: headers of the upstream response, dict
+        :return: bool
+        """
+        if not (headers.get('etag') or headers.get('last-modified')):
+            return False
+
+        content_length = headers.get('content-length')
+        return content_length is None or int(content_length) <= self.max_bytes
+
+    def stream_and_store(self, url, chunks, metadata):
+        """Yield the `chunks` of the file and store it in the cache once all were read.
+
+        The file is not stored if the iteration is not completed, e.g. when the consumer
+        disconnects, or if it is larger than the cache.
+
+        :param url: source url of the file, str
+        :param chunks: iterable of bytes
+        :param metadata: upstream metadata of the file (etag, last_modified, content_type,
+            filename), dict
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=self.TEMP_SUFFIX)
+        size = 0
+        completed = False
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    if f is not None:
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            f = None
+                        else:
+                            f.write(chunk)
+                    yield chunk
+            completed = size <= self.max_bytes
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+            if completed:
+                self._commit(url, temp_path, dict(metadata, size=size))
+            elif os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _commit(self, url, temp_path, metadata):
+        data_path, metadata_path = self._get_paths(url)
+        temp_metadata_path = None
+        try:
+            fd, temp_metadata_path = tempfile.mkstemp(dir=self.directory, suffix=self.TEMP_SUFFIX)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(metadata, f)
+            # the data is replaced first, the entry is invalid until its metadata matches
+            os.replace(temp_path, data_path)
+            os.replace(temp_metadata_path, metadata_path)
+        except OSError as e:
+            logger.warning(f'Failed to store {url} in the content cache: {e}')
+            for path in (temp_path, temp_metadata_path, data_path):
+                if path and os.path.exists(path):
+                    os.remove(path)
+            return
+
+        logger.debug(f'Stored {metadata["size"]} bytes of {url} in the content cache.')
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = sorted(self._list_entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            for data_path, size, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                for path in (data_path, data_path + self.METADATA_SUFFIX):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+
+    def _list_entries(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if '.' in entry.name or not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _remove_temp_files(self, max_age=24 * 3600):
+        # Left over by killed workers, the recent ones may be in use by other workers.
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    if (entry.name.endswith(self.TEMP_SUFFIX)
+                            and time.time() - entry.stat().st_mtime > max_age):
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def _get_paths(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        data_path = os.path.join(self.directory, key)
+        return data_path, data_path + self.METADATA_SUFFIX
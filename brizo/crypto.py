@@ -0,0 +1,113 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import logging
+
+from eth_keys import KeyAPI
+from eth_keys.backends import CoinCurveECCBackend, NativeECCBackend, is_coincurve_available
+from eth_keys.exceptions import BadSignature, ValidationError
+from eth_utils import keccak, to_bytes
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = {
+    'coincurve': CoinCurveECCBackend,
+    'native': NativeECCBackend
+}
+
+
+def _to_bytes(value):
+    if isinstance(value, str):
+        return to_bytes(hexstr=value)
+    return bytes(value)
+
+
+def add_ethereum_prefix_and_hash(message):
+    """Hash of a text message with the `personal_sign` prefix, as signed by the wallets."""
+    return keccak(text=f'\x19Ethereum Signed Message:\n{len(message)}{message}')
+
+
+class SignatureBackend:
+    """secp256k1 signing and recovery of the signatures of the consumers and the provider.
+
+    `coincurve` uses libsecp256k1 and is an order of magnitude faster than the `native` pure
+    Python implementation, `auto` picks `coincurve` when it is installed. The signatures and
+    the recovered addresses are the same as the ones of `Keeper.sign_hash` and
+    `Keeper.ec_recover`.
+    """
+
+    def __init__(self, backend='auto'):
+        """
+        :param backend: `auto`, `coincurve` or `native`, str
+        """
+        if backend == 'auto':
+            backend = 'coincurve' if is_coincurve_available() else 'native'
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown signature backend {backend}.')
+        if backend == 'coincurve' and not is_coincurve_available():
+            raise ValueError('The coincurve signature backend requires the coincurve package.')
+
+        self.name = backend
+        self._keys = KeyAPI(BACKENDS[backend])
+        logger.debug(f'Using the {backend} signature backend.')
+
+    def recover_hash(self, msg_hash, signature):
+        """Return the checksum address that signed `msg_hash`.
+
+        :param msg_hash: hash of the message, bytes or hex str
+        :param signature: r, s and v of the signature, v being 0, 1, 27 or 28, bytes or hex str
+        :return: checksum address, str
+        """
+        signature = _to_bytes(signature)
+        if len(signature) != 65:
+            raise ValueError(f'invalid signature, expecting bytes of length 65, '
+                             f'got {len(signature)}')
+
+        v = signature[64]
+        v = v - 27 if v in (27, 28) else v % 2
+        key_signature = self._keys.Signature(signature_bytes=signature[:64] + bytes([v]))
+        public_key = key_signature.recover_public_key_from_msg_hash(_to_bytes(msg_hash))
+        return public_key.to_checksum_address()
+
+    def personal_recover(self, message, signature):
+        """Return the checksum address that signed the text `message` with `personal_sign`."""
+        return self.recover_hash(add_ethereum_prefix_and_hash(message), signature)
+
+    def sign_hash(self, msg_hash, private_key):
+        """Sign `msg_hash` as is, like `Keeper.sign_hash`.
+
+        :param msg_hash: hash to sign, bytes or hex str
+        :param private_key: bytes or hex str
+        :return: hex str of r, s and v, v being 27 or 28
+        """
+        key = self._keys.PrivateKey(_to_bytes(private_key))
+        signature = key.sign_msg_hash(_to_bytes(msg_hash))
+        return '0x' + (signature.to_bytes()[:64] + bytes([signature.v + 27])).hex()
+
+    def batch_recover(self, items):
+        """Recover the signers of several signatures.
+
+        :param items: iterable of tuples (msg_hash, signature)
+        :return: list of checksum addresses, None for the invalid signatures
+        """
+        addresses = []
+        for msg_hash, signature in items:
+            try:
+                addresses.append(self.recover_hash(msg_hash, signature))
+            except (BadSignature, ValidationError, ValueError) as e:
+                logger.debug(f'Invalid signature {signature}: {e}')
+                addresses.append(None)
+        return addresses
+
+    def batch_verify(self, items):
+        """Check several signatures against their expected signers.
+
+        :param items: iterable of tuples (msg_hash, signature, address)
+        :return: list of bool
+        """
+        items = list(items)
+        addresses = self.batch_recover((msg_hash, signature) for msg_hash, signature, _ in items)
+        return [
+            recovered is not None and recovered.lower() == address.lower()
+            for recovered, (_, _, address) in zip(addresses, items)
+        ]
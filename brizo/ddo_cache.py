@@ -0,0 +1,98 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import logging
+import threading
+import time
+
+from ocean_keeper.didregistry import DIDRegistry
+from ocean_keeper.event_filter import EventFilter
+from ocean_keeper.web3_provider import Web3Provider
+from ocean_utils.did import id_to_did
+from ocean_utils.did_resolver.did_resolver import DIDResolver
+
+from brizo.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class DDOCache:
+    """Cache of resolved DDOs keyed by DID.
+
+    A cached DDO is dropped when it expires or when the DIDRegistry emits a
+    `DIDAttributeRegistered` event for its DID. The registry events are polled at most once
+    every `poll_interval` seconds, on lookup.
+    """
+
+    def __init__(self, maxsize, ttl, poll_interval=5):
+        """
+        :param maxsize: max number of cached DDOs, int
+        :param ttl: time to live of a cached DDO in seconds, float
+        :param poll_interval: min number of seconds between two polls of the registry events
+        """
+        self._cache = TTLCache(maxsize, ttl)
+        self._poll_interval = poll_interval
+        self._last_block = None
+        self._polled_at = 0
+        self._poll_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self._cache.maxsize > 0 and self._cache.ttl > 0
+
+    def stats(self):
+        return self._cache.stats()
+
+    def resolve(self, keeper, did):
+        """Return the DDO of `did`, resolving it only if it is not cached.
+
+        :param keeper: Keeper instance
+        :param did: DID, str
+        :return: DDO instance
+        """
+        if not self.enabled:
+            return DIDResolver(keeper.did_registry).resolve(did)
+
+        self._invalidate_updated_dids(keeper)
+        return self._cache.get_or_load(
+            did.lower(),
+            lambda: DIDResolver(keeper.did_registry).resolve(did),
+            ttl=lambda ddo: None if ddo else 0
+        )
+
+    def invalidate(self, did):
+        self._cache.pop(did.lower())
+
+    def _invalidate_updated_dids(self, keeper):
+        if time.monotonic() - self._polled_at < self._poll_interval:
+            return
+
+        # Only one thread polls, the others keep using the cache meanwhile.
+        if not self._poll_lock.acquire(blocking=False):
+            return
+
+        try:
+            latest_block = Web3Provider.get_web3().eth.blockNumber
+            if self._last_block is None or latest_block < self._last_block:
+                self._cache.clear()
+            elif latest_block > self._last_block:
+                event_filter = EventFilter(
+                    DIDRegistry.DID_REGISTRY_EVENT_NAME,
+                    getattr(keeper.did_registry.events, DIDRegistry.DID_REGISTRY_EVENT_NAME),
+                    {},
+                    from_block=self._last_block + 1,
+                    to_block=latest_block
+                )
+                for log in event_filter.get_all_entries():
+                    did = id_to_did(log.args['_did'])
+                    logger.debug(f'DDO of {did} was updated, removing it from the cache.')
+                    self.invalidate(did)
+
+            self._last_block = latest_block
+            self._polled_at = time.monotonic()
+        except Exception as e:
+            logger.warning(f'Failed to get the DIDRegistry events, clearing the DDO cache: {e}')
+            self._cache.clear()
+            self._last_block = None
+        finally:
+            self._poll_lock.release()
@@ -0,0 +1,71 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import logging
+import os
+
+from brizo.cache import TTLCache
+
+try:
+    from Crypto.Cipher import AES
+except ImportError:
+    AES = None
+
+logger = logging.getLogger(__name__)
+
+
+class DecryptedFilesCache:
+    """Cache of the decrypted files lists of assets.
+
+    Entries are keyed by the DID and a hash of the asset's `encryptedFiles`, so a new
+    encrypted files list for the same DID never returns a stale entry. With `encrypt`
+    the cached plain text is kept encrypted in memory (AES-GCM with a random per-process
+    key), this requires `pycryptodome`.
+    """
+
+    def __init__(self, maxsize, ttl, encrypt=True):
+        """
+        :param maxsize: max number of cached files lists, int
+        :param ttl: time to live of a cached files list in seconds, float
+        :param encrypt: keep the cached files lists encrypted in memory, bool
+        """
+        self._cache = TTLCache(maxsize, ttl)
+        self._key = None
+        if encrypt:
+            if AES is None:
+                logger.warning('pycryptodome is not installed, the decrypted files lists '
+                               'are cached in plain text.')
+            else:
+                self._key = os.urandom(32)
+
+    def stats(self):
+        return self._cache.stats()
+
+    def get_or_decrypt(self, did, encrypted_files, decrypt):
+        """Return the decrypted files list, calling `decrypt()` only if it is not cached.
+
+        :param did: DID of the asset, str
+        :param encrypted_files: the asset's encrypted files list, str
+        :param decrypt: function without arguments returning the decrypted files list, str
+        :return: the decrypted files list, str
+        """
+        key = (did.lower(), hashlib.sha256(encrypted_files.encode()).hexdigest())
+        cached = self._cache.get_or_load(key, lambda: self._seal(decrypt()))
+        return self._unseal(cached)
+
+    def _seal(self, plain_text):
+        if self._key is None:
+            return plain_text
+
+        cipher = AES.new(self._key, AES.MODE_GCM)
+        cipher_text, tag = cipher.encrypt_and_digest(plain_text.encode())
+        return cipher.nonce, tag, cipher_text
+
+    def _unseal(self, sealed):
+        if self._key is None:
+            return sealed
+
+        nonce, tag, cipher_text = sealed
+        cipher = AES.new(self._key, AES.MODE_GCM, nonce=nonce)
+        return cipher.decrypt_and_verify(cipher_text, tag).decode()
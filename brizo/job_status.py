@@ -0,0 +1,200 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class TooManyWatchersError(Exception):
+    """No more compute job can be watched, by this consumer or by this process."""
+
+
+def get_status_version(value):
+    """Version of a status, a digest of its content.
+
+    It only depends on the status, so a client gets the same version from all the watchers of
+    a job, in all the processes and after a watcher was restarted.
+    """
+    content = json.dumps(value, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(content.encode()).hexdigest()[:16]
+
+
+class JobStatusWatcher:
+    """Poll the status of a compute job upstream and wake up the requests waiting for a change.
+
+    The watcher stops once it has had no subscriber for `idle_timeout` seconds.
+    """
+
+    def __init__(self, fetch, interval, idle_timeout, on_stop=None):
+        """
+        :param fetch: function returning the status of the job, a tuple (status_code, status)
+        :param interval: seconds between two upstream requests, float
+        :param idle_timeout: seconds without subscriber after which the watcher stops, float
+        :param on_stop: function called with the watcher once it stopped
+        """
+        self.version = None
+        self.value = None
+        self._fetch = fetch
+        self._interval = interval
+        self._idle_timeout = idle_timeout
+        self._on_stop = on_stop
+        self._subscribers = 0
+        self._last_seen = time.monotonic()
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def subscribe(self):
+        """Register a subscriber, return False if the watcher already stopped."""
+        with self._condition:
+            if self._stopped:
+                return False
+            self._subscribers += 1
+            return True
+
+    def unsubscribe(self):
+        with self._condition:
+            self._subscribers -= 1
+            self._last_seen = time.monotonic()
+
+    def wait(self, since, timeout):
+        """Wait for a status with a version other than `since`, at most `timeout` seconds.
+
+        :param since: version of the status known to the client, None if it has none, str
+        :return: tuple (version, value), value is None if the status was not fetched yet
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self.value is None or self.version == since:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return self.version, self.value
+
+    def _run(self):
+        while True:
+            try:
+                value = self._fetch()
+            except Exception as e:
+                logger.warning(f'Failed to get the status of a compute job: {e}')
+                value = (502, {'error': f'Failed to get the status of the job: {e}'})
+
+            with self._condition:
+                if value != self.value:
+                    self.value = value
+                    self.version = get_status_version(value)
+                    self._condition.notify_all()
+                if (not self._subscribers
+                        and time.monotonic() - self._last_seen > self._idle_timeout):
+                    self._stopped = True
+                    break
+
+            time.sleep(self._interval)
+
+        if self._on_stop:
+            self._on_stop(self)
+
+
+class JobStatusHub:
+    """Watchers of the compute jobs, one per job for all the requests waiting for its status."""
+
+    def __init__(self, interval, idle_timeout, max_watchers, max_watchers_per_owner):
+        """
+        :param interval: seconds between two upstream requests of the status of a job, float
+        :param idle_timeout: seconds a job is watched after its last request, float
+        :param max_watchers: max number of jobs watched at the same time, int
+        :param max_watchers_per_owner: max number of jobs of one owner watched at the same
+            time, int
+        """
+        self._interval = interval
+        self._idle_timeout = idle_timeout
+        self._max_watchers = max_watchers
+        self._max_watchers_per_owner = max_watchers_per_owner
+        self._watchers = dict()
+        self._owners = Counter()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._watchers)
+
+    def wait(self, owner, key, fetch, since, timeout):
+        """Wait for a status of the job other than the version `since`.
+
+        :param owner: the owner of the job, str
+        :param key: identifies the job, hashable
+        :param fetch: function returning the status of the job, used if it is not watched yet
+        :param since: version of the status known to the client, None if it has none, str
+        :param timeout: max seconds to wait, float
+        :return: tuple (version, value)
+        """
+        watcher = self._subscribe(owner, key, fetch)
+        try:
+            return watcher.wait(since, timeout)
+        finally:
+            watcher.unsubscribe()
+
+    def stream(self, owner, key, fetch, since, duration, heartbeat=15):
+        """Yield the status changes of the job as server-sent events for `duration` seconds.
+
+        The `id` of an event is the version of the status, a client reconnecting sends it
+        back in the `Last-Event-ID` header. A comment is sent every `heartbeat` seconds
+        without change to keep the connection open.
+        """
+        deadline = time.monotonic() + duration
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            version, value = self.wait(owner, key, fetch, since, min(heartbeat, remaining))
+            if value is not None and version != since:
+                since = version
+                yield f'id: {version}\ndata: {json.dumps(format_job_status(version, value))}\n\n'
+            else:
+                yield ': keep-alive\n\n'
+
+    def _subscribe(self, owner, key, fetch):
+        key = (owner, key)
+        with self._lock:
+            watcher = self._watchers.get(key)
+            if watcher is not None and watcher.subscribe():
+                return watcher
+
+            if watcher is None:
+                if len(self._watchers) >= self._max_watchers:
+                    raise TooManyWatchersError(
+                        f'Too many compute jobs are watched, at most {self._max_watchers}.')
+                if self._owners[owner] >= self._max_watchers_per_owner:
+                    raise TooManyWatchersError(
+                        f'Too many compute jobs of {owner} are watched, at most '
+                        f'{self._max_watchers_per_owner}.')
+                self._owners[owner] += 1
+
+            watcher = JobStatusWatcher(
+                fetch, self._interval, self._idle_timeout,
+                on_stop=lambda stopped: self._remove(key, stopped))
+            watcher.subscribe()
+            self._watchers[key] = watcher
+            return watcher
+
+    def _remove(self, key, watcher):
+        with self._lock:
+            if self._watchers.get(key) is watcher:
+                del self._watchers[key]
+                owner = key[0]
+                self._owners[owner] -= 1
+                if self._owners[owner] <= 0:
+                    del self._owners[owner]
+
+
+def format_job_status(version, value):
+    status_code, status = value
+    return {'version': version, 'statusCode': status_code, 'status': status}
@@ -0,0 +1,72 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import logging
+import threading
+
+from osmosis_driver_interface.constants import DATA
+from osmosis_driver_interface.osmosis import Osmosis
+from osmosis_driver_interface.utils import start_plugin
+
+logger = logging.getLogger(__name__)
+
+
+class OsmosisDriverRegistry:
+    """Process-wide registry of initialized Osmosis data plugins.
+
+    `Osmosis(url, config_file)` loads the driver module, parses the config and creates the
+    storage clients each time. The registry keeps one data plugin per driver name
+    (`Osmosis.parse_url`) and config file instead, so a download url is generated by a method
+    call on an already initialized plugin.
+    """
+
+    def __init__(self):
+        self._plugins = dict()
+        self._lock = threading.Lock()
+
+    def get_data_plugin(self, url, config_file=None):
+        """Return the data plugin of the driver handling `url`.
+
+        :param url: url of the file, str
+        :param config_file: path of the config file of the plugins, str
+        :return: Osmosis data plugin instance
+        """
+        return self.get_driver(Osmosis.parse_url(url), config_file)
+
+    def get_driver(self, driver, config_file=None):
+        """
+        :param driver: name of the driver, e.g. `azure`, `aws`, `ipfs` or `on_premise`
+        :param config_file: path of the config file of the plugins, str
+        :return: Osmosis data plugin instance
+        """
+        key = (driver, config_file)
+        plugin = self._plugins.get(key)
+        if plugin is not None:
+            return plugin
+
+        with self._lock:
+            plugin = self._plugins.get(key)
+            if plugin is None:
+                logger.debug(f'Initializing the Osmosis {driver} data plugin.')
+                plugin = start_plugin(DATA, driver, config_file)
+                self._plugins[key] = plugin
+            return plugin
+
+    def warm_up(self, drivers, config_file=None):
+        """Initialize the data plugins of `drivers` ahead of the first request.
+
+        A driver that fails to initialize, e.g. without credentials, is skipped and will
+        be initialized again on first use.
+
+        :param drivers: list of driver names
+        :param config_file: path of the config file of the plugins, str
+        """
+        for driver in drivers:
+            try:
+                self.get_driver(driver, config_file)
+            except Exception as e:
+                logger.warning(f'Failed to initialize the Osmosis {driver} data plugin: {e}')
+
+    def clear(self):
+        # Not locked, this is also called from the config reload signal handler.
+        self._plugins = dict()
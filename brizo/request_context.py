@@ -0,0 +1,52 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+from brizo.util import (
+    get_agreement_authorization,
+    get_config,
+    keeper_instance,
+    resolve_asset
+)
+
+
+class RequestContext:
+    """Memoized lookups of a single request.
+
+    One context is created per request and passed to the util functions, so that the
+    config, the keeper instance, the agreements and the DDOs are fetched at most once while
+    serving the request.
+    """
+
+    def __init__(self):
+        self._values = dict()
+
+    @property
+    def config(self):
+        return self._memoize('config', get_config)
+
+    @property
+    def keeper(self):
+        return self._memoize('keeper', keeper_instance)
+
+    def resolve_asset(self, did):
+        """
+        :param did: DID, str
+        :return: DDO instance
+        """
+        return self._memoize(('asset', did.lower()), lambda: resolve_asset(did, self.keeper))
+
+    def get_agreement_authorization(self, agreement_id, consumer_address, service_type):
+        """See `brizo.util.get_agreement_authorization`.
+
+        :return: tuple (agreement, is_authorized, block_time)
+        """
+        return self._memoize(
+            ('authorization', agreement_id.lower(), consumer_address, service_type),
+            lambda: get_agreement_authorization(
+                self.keeper, agreement_id, consumer_address, service_type, context=self)
+        )
+
+    def _memoize(self, key, load):
+        if key not in self._values:
+            self._values[key] = load()
+        return self._values[key]
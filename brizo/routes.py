@@ -8,26 +8,41 @@ from flask import Blueprint, jsonify, request, Response
 from ocean_keeper.utils import add_ethereum_prefix_and_hash_msg
 from ocean_utils.agreements.service_types import ServiceTypes
 from ocean_utils.did import id_to_did, did_to_id
-from ocean_utils.did_resolver.did_resolver import DIDResolver
 from ocean_utils.http_requests.requests_session import get_requests_session
 from secret_store_client.client import RPCError
 
 from brizo.exceptions import InvalidSignatureError, ServiceAgreementExpired, ServiceAgreementUnauthorized
+from brizo.job_status import TooManyWatchersError, format_job_status
 from brizo.log import setup_logging
 from brizo.myapp import app
+from brizo.request_context import RequestContext
 from brizo.util import (
+    SESSION_TOKEN_HEADER,
+    add_session_token_header,
+    build_asset_archive_response,
     build_download_response,
+    build_redirect_response,
     check_required_attributes,
     do_secret_store_encrypt,
     get_asset_url_at_index,
     get_asset_urls,
+    get_agreement_actors_index,
     get_config,
     get_download_url,
+    get_job_status_hub,
+    get_redirect_url,
     get_provider_account,
-    is_access_granted,
+    install_config_reload_handler,
+    is_download_redirect_enabled,
+    is_multi_file_index,
+    issue_session_token,
     keeper_instance,
     setup_keeper,
+    setup_session_tokens,
+    sign_hash,
+    unlock_provider_key,
     verify_signature,
+    verify_session_token,
     get_compute_endpoint,
     build_stage_algorithm_dict,
     build_stage_output_dict,
@@ -35,13 +50,18 @@ from brizo.util import (
     validate_algorithm_dict,
     get_request_data,
     validate_agreement_expiry,
-    get_agreement_block_time,
-    validate_agreement_condition)
+    warm_up_osmosis_drivers)
 
 setup_logging()
+install_config_reload_handler()
 services = Blueprint('services', __name__)
 setup_keeper(app.config['CONFIG_FILE'])
+# Start syncing the agreement index now rather than on the first request.
+get_agreement_actors_index()
+warm_up_osmosis_drivers(app.config['CONFIG_FILE'])
 provider_acc = get_provider_account()
+unlock_provider_key(provider_acc)
+setup_session_tokens()
 requests_session = get_requests_session()
 
 logger = logging.getLogger(__name__)
@@ -182,10 +202,21 @@ def consume():
         description: Signature of the documentId to verify that the consumer has rights to download the asset.
       - name: index
         in: query
-        description: Index of the file in the array of files.
+        description: Index of the file in the array of files. Use `all` or a comma separated
+                     list of indices to download several files in a zip archive.
+      - name: sessionToken
+        in: query
+        description: Session token of a previous response to this consumer for this agreement,
+                     in place of the signature. It can also be sent in the
+                     `X-Brizo-Session-Token` header.
     responses:
       200:
-        description: Redirect to valid asset url.
+        description: Redirect to valid asset url. When the session tokens are enabled, a
+                     response to a request with a signature has a session token in the
+                     `X-Brizo-Session-Token` header.
+      302:
+        description: Redirect to the pre-signed url of the file, when the redirect mode is
+                     enabled for the asset.
       400:
         description: One of the required attributes is missing.
       401:
@@ -203,16 +234,28 @@ def consume():
     if msg:
         return msg, status
 
-    if not (data.get('url') or (data.get('signature') and data.get('index'))):
-        return f'Either `url` or `signature and index` are required in the call to "consume".', 400
+    session_token = data.get('sessionToken') or request.headers.get(SESSION_TOKEN_HEADER)
+    if not (data.get('url') or ((data.get('signature') or session_token) and data.get('index'))):
+        return f'Either `url` or `signature` (or `sessionToken`) and `index` are required in ' \
+               f'the call to "consume".', 400
 
     try:
-        keeper = keeper_instance()
+        context = RequestContext()
+        keeper = context.keeper
         agreement_id = data.get('serviceAgreementId')
         consumer_address = data.get('consumerAddress')
 
         msg_unauthorized = ''
-        if agreement_id.startswith('did:op:'):
+        # A valid session token stands for the checks of a previous request of the consumer.
+        session_did = verify_session_token(session_token, agreement_id, consumer_address)
+        if session_token and not session_did and not (data.get('url') or data.get('signature')):
+            msg = 'Invalid or expired session token.'
+            logger.warning(msg)
+            return jsonify(error=msg), 401
+
+        if session_did:
+            did = session_did
+        elif agreement_id.startswith('did:op:'):
             # This is a hack to support a specific use case where the consumer has been
             # granted access directly without using the service agreements flow.
             did = agreement_id
@@ -221,14 +264,11 @@ def consume():
                 msg_unauthorized = f'Consumer address {consumer_address} is not authorized for DID {did}.'
 
         else:
-            asset_id = keeper.agreement_manager.get_agreement(agreement_id).did
-            did = id_to_did(asset_id)
-
-            if not is_access_granted(
-                    agreement_id,
-                    did,
-                    consumer_address,
-                    keeper):
+            agreement, is_authorized, block_time = context.get_agreement_authorization(
+                agreement_id, consumer_address, ServiceTypes.ASSET_ACCESS)
+            did = id_to_did(agreement.did)
+
+            if not is_authorized:
                 msg_unauthorized = (
                     'Checking access permissions failed. Either consumer address does not have '
                     'permission to consume this asset or consumer address and/or service agreement '
@@ -239,30 +279,58 @@ def consume():
             logger.warning(msg_unauthorized)
             return msg, 401
 
-        asset = DIDResolver(keeper.did_registry).resolve(did)
+        asset = context.resolve_asset(did)
 
         #########################
         # Check expiry of service agreement
-        if agreement_id != did:
+        if agreement_id != did and not session_did:
             # Check expiry of service agreement
-            block_time = get_agreement_block_time(agreement_id)
             validate_agreement_expiry(asset.get_service(ServiceTypes.ASSET_ACCESS), block_time)
 
         content_type = None
+        file_attributes = None
+        new_session_token = None
         url = data.get('url')
+        # Only the urls of the decrypted files list may be served from the local files, the
+        # `url` of the consumer is not verified.
+        is_asset_file = not url
         if not url:
-            signature = data.get('signature')
-            index = int(data.get('index'))
-            verify_signature(keeper, consumer_address, signature, agreement_id)
+            if not session_did:
+                signature = data.get('signature')
+                verify_signature(keeper, consumer_address, signature, agreement_id)
+                if agreement_id != did:
+                    new_session_token = issue_session_token(
+                        agreement_id, consumer_address, did,
+                        asset.get_service(ServiceTypes.ASSET_ACCESS), block_time)
+
+            if is_multi_file_index(data.get('index')):
+                response = build_asset_archive_response(
+                    requests_session, asset, data.get('index'), provider_acc,
+                    app.config['CONFIG_FILE'])
+                return add_session_token_header(response, new_session_token)
 
+            index = int(data.get('index'))
             file_attributes = asset.metadata['main']['files'][index]
             content_type = file_attributes.get('contentType', None)
             url = get_asset_url_at_index(index, asset, provider_acc)
 
-        download_url = get_download_url(url, app.config['CONFIG_FILE'])
-        logger.info(f'Done processing consume request for asset {did}, agreementId {agreement_id},'
-                    f' url {download_url}')
-        return build_download_response(request, requests_session, url, download_url, content_type)
+        # Only short-lived pre-signed urls are handed out, the other files are proxied.
+        redirect_url = None
+        if is_download_redirect_enabled(asset, context.config):
+            redirect_url = get_redirect_url(url, app.config['CONFIG_FILE'], context.config)
+        if redirect_url:
+            logger.info(f'Done processing consume request for asset {did}, agreementId '
+                        f'{agreement_id}, redirected to the pre-signed url')
+            response = build_redirect_response(
+                redirect_url, agreement_id, did, consumer_address, url)
+        else:
+            download_url = get_download_url(url, app.config['CONFIG_FILE'])
+            logger.info(f'Done processing consume request for asset {did}, agreementId '
+                        f'{agreement_id}, url {download_url}')
+            response = build_download_response(
+                request, requests_session, url, download_url, content_type, file_attributes,
+                allow_local_file=is_asset_file)
+        return add_session_token_header(response, new_session_token)
 
     except ServiceAgreementExpired as e:
         logger.error(e, exc_info=1)
@@ -345,8 +413,7 @@ def compute_delete_job():
         verify_signature(keeper_instance(), owner, signature, original_msg)
 
         msg_to_sign = f'{provider_acc.address}{body.get("jobId", "")}{body.get("agreementId", "")}'
-        body['providerSignature'] = keeper_instance(
-        ).sign_hash(msg_to_sign, provider_acc)
+        body['providerSignature'] = sign_hash(msg_to_sign, provider_acc)
         response = requests_session.delete(
             get_compute_endpoint(),
             params=body,
@@ -439,8 +506,7 @@ def compute_stop_job():
 
         msg_to_sign = f'{provider_acc.address}{body.get("jobId", "")}{body.get("agreementId", "")}'
         msg_hash = add_ethereum_prefix_and_hash_msg(msg_to_sign)
-        body['providerSignature'] = keeper_instance().sign_hash(msg_hash,
-                                                                provider_acc)
+        body['providerSignature'] = sign_hash(msg_hash, provider_acc)
         response = requests_session.put(
             get_compute_endpoint(),
             params=body,
@@ -515,31 +581,8 @@ def compute_get_status_job():
         return jsonify(error=msg), status
 
     try:
-        agreement_id = data.get('serviceAgreementId')
-        owner = data.get('consumerAddress')
-        job_id = data.get('jobId')
-        body = dict()
-        body['providerAddress'] = provider_acc.address
-        if owner is not None:
-            body['owner'] = owner
-        if job_id is not None:
-            body['jobId'] = job_id
-        if agreement_id is not None:
-            body['agreementId'] = agreement_id
-
-        # Consumer signature
-        signature = data.get('signature')
-        original_msg = f'{body.get("owner", "")}{body.get("jobId", "")}{body.get("agreementId", "")}'
-        verify_signature(keeper_instance(), owner, signature, original_msg)
-
-        msg_to_sign = f'{provider_acc.address}{body.get("jobId", "")}{body.get("agreementId", "")}'
-        msg_hash = add_ethereum_prefix_and_hash_msg(msg_to_sign)
-        body['providerSignature'] = keeper_instance().sign_hash(msg_hash,
-                                                                provider_acc)
-        response = requests_session.get(
-            get_compute_endpoint(),
-            params=body,
-            headers={'content-type': 'application/json'})
+        body = _get_compute_status_body(data)
+        response = _request_compute_status(body)
         return Response(
             response.content,
             response.status_code,
@@ -556,6 +599,127 @@ def compute_get_status_job():
         return jsonify(error=f'Error : {str(e)}'), 500
 
 
+@services.route('/compute/status', methods=['GET'])
+def compute_watch_status_job():
+    """Wait for a change of the status of a specific jobid/agreementId/owner.
+
+    The status is requested from the operator service by one watcher per job, shared by all
+    the requests for this job, and the requests get it when it changes. Without the
+    `text/event-stream` Accept header the request is a long poll: it returns as soon as the
+    status has a version other than `since`, or after `timeout` seconds with the current
+    status. With it, the changes are sent as server-sent events, the `id` of an event being
+    the version of the status. The version is a digest of the status, so it is the same in
+    all the Brizo processes.
+
+    ---
+    tags:
+      - services
+    consumes:
+      - application/json
+    parameters:
+      - name: signature
+        in: query
+        description: Signature of (consumerAddress+jobId+serviceAgreementId) to verify the consumer of
+            this agreement/compute job. The signature uses ethereum based signing method
+            (see https://github.com/ethereum/EIPs/pull/683)
+        type: string
+      - name: serviceAgreementId
+        in: query
+        description: The ID of the service agreement, must exist on-chain.
+        type: string
+      - name: consumerAddress
+        in: query
+        description: The consumer ethereum address.
+        required: true
+        type: string
+      - name: jobId
+        in: query
+        description: The ID of the compute job.
+        type: string
+      - name: since
+        in: query
+        description: Version of the last status known to the client, if any. The
+            `Last-Event-ID` header is used instead for the server-sent events.
+        type: string
+      - name: timeout
+        in: query
+        description: Max seconds to wait for another status, at most `compute_status.max_wait`.
+        type: integer
+
+    responses:
+      200:
+        description: The status of the job, `{"version", "statusCode", "status"}` where
+            `status` is the response of the operator service, or a stream of server-sent
+            events of this object.
+      400:
+        description: One of the required attributes is missing.
+      401:
+        description: Consumer signature is invalid or failed verification.
+      500:
+        description: General server error
+      503:
+        description: Too many compute jobs are watched, by this consumer or by Brizo.
+      504:
+        description: The status could not be requested from the operator service in time.
+    """
+    data = get_request_data(request)
+    required_attributes = [
+        'signature',
+        'consumerAddress'
+    ]
+    msg, status = check_required_attributes(
+        required_attributes, data, 'compute')
+    if msg:
+        return jsonify(error=msg), status
+
+    try:
+        body = _get_compute_status_body(data)
+
+        def _fetch_status():
+            response = _request_compute_status(dict(body))
+            try:
+                return response.status_code, response.json()
+            except ValueError:
+                return response.status_code, response.text
+
+        config = get_config()
+        owner_key = body['owner'].lower()
+        key = (body.get('jobId'), body.get('agreementId'))
+        hub = get_job_status_hub()
+        if 'text/event-stream' in request.headers.get('Accept', ''):
+            since = request.headers.get('Last-Event-ID') or data.get('since')
+            # Start watching the job before the response, to reply 503 if it cannot be.
+            hub.wait(owner_key, key, _fetch_status, since, 0)
+            return Response(
+                hub.stream(owner_key, key, _fetch_status, since, config.compute_status_max_wait),
+                200,
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+                content_type='text/event-stream'
+            )
+
+        since = data.get('since')
+        timeout = min(float(data.get('timeout') or config.compute_status_max_wait),
+                      config.compute_status_max_wait)
+        version, value = hub.wait(owner_key, key, _fetch_status, since, timeout)
+        if value is None:
+            return jsonify(error='The status of the job is not available yet.'), 504
+
+        return jsonify(format_job_status(version, value)), 200
+
+    except TooManyWatchersError as e:
+        logger.warning(str(e))
+        return jsonify(error=str(e)), 503
+
+    except InvalidSignatureError as e:
+        msg = f'Consumer signature failed verification: {e}'
+        logger.error(msg, exc_info=1)
+        return jsonify(error=msg), 401
+
+    except (ValueError, Exception) as e:
+        logger.error(f'Error- {str(e)}', exc_info=1)
+        return jsonify(error=f'Error : {str(e)}'), 500
+
+
 @services.route('/compute', methods=['POST'])
 def compute_start_job():
     """Call the execution of a workflow.
@@ -629,7 +793,8 @@ def compute_start_job():
     output_def = data.get('output', dict())
 
     try:
-        keeper = keeper_instance()
+        context = RequestContext()
+        keeper = context.keeper
         # Validate algorithm info
         if not (algorithm_meta or algorithm_did):
             msg = f'Need an `algorithmMeta` or `algorithmDid` to run, otherwise don\'t bother.'
@@ -642,9 +807,10 @@ def compute_start_job():
 
         ########################
         # ASSET
-        asset_id = keeper.agreement_manager.get_agreement(agreement_id).did
-        did = id_to_did(asset_id)
-        asset = DIDResolver(keeper.did_registry).resolve(did)
+        agreement, is_authorized, block_time = context.get_agreement_authorization(
+            agreement_id, consumer_address, ServiceTypes.CLOUD_COMPUTE)
+        did = id_to_did(agreement.did)
+        asset = context.resolve_asset(did)
         compute_service = asset.get_service(ServiceTypes.CLOUD_COMPUTE)
         if compute_service is None:
             return jsonify(error=f'This DID has no compute service {did}.'), 400
@@ -660,7 +826,7 @@ def compute_start_job():
             return jsonify(error=f'cannot run raw algorithm on this did {did}.'), 400
 
         # Validate agreement condition
-        if not validate_agreement_condition(agreement_id, did, consumer_address, keeper):
+        if not is_authorized:
             raise ServiceAgreementUnauthorized(
                 f'Consumer {consumer_address} is not authorized under service agreement {agreement_id}.'
                 f'It is possible that the transaction has not been validated yet. Please ensure that '
@@ -675,7 +841,7 @@ def compute_start_job():
                 algorithm_meta, str) else algorithm_meta
 
         algorithm_dict = build_stage_algorithm_dict(
-            algorithm_did, algorithm_meta, provider_acc)
+            algorithm_did, algorithm_meta, provider_acc, context)
         error_msg, status_code = validate_algorithm_dict(
             algorithm_dict, algorithm_did)
         if error_msg:
@@ -696,7 +862,6 @@ def compute_start_job():
 
         #########################
         # Check expiry of service agreement
-        block_time = get_agreement_block_time(agreement_id)
         validate_agreement_expiry(asset.get_service(
             ServiceTypes.CLOUD_COMPUTE), block_time)
 
@@ -706,7 +871,7 @@ def compute_start_job():
             output_def = json.loads(output_def) if isinstance(
                 output_def, str) else output_def
         output_dict = build_stage_output_dict(
-            output_def, asset, consumer_address, provider_acc)
+            output_def, asset, consumer_address, provider_acc, context)
 
         #########################
         # STAGE
@@ -723,7 +888,7 @@ def compute_start_job():
         msg_hash = add_ethereum_prefix_and_hash_msg(msg_to_sign)
         payload = {
             'workflow': workflow,
-            'providerSignature': keeper.sign_hash(msg_hash, provider_acc),
+            'providerSignature': sign_hash(msg_hash, provider_acc),
             'agreementId': agreement_id,
             'owner': consumer_address,
             'providerAddress': provider_acc.address
@@ -751,3 +916,37 @@ def compute_start_job():
     except (ValueError, KeyError, Exception) as e:
         logger.error(f'Error- {str(e)}', exc_info=1)
         return jsonify(error=f'Error : {str(e)}'), 500
+
+
+def _get_compute_status_body(data):
+    """Return the body of the request of the status of the compute jobs of a consumer.
+
+    :param data: the request data, with `consumerAddress`, `signature` and optionally
+        `jobId` and `serviceAgreementId`
+    :raises InvalidSignatureError: if the signature of the consumer is invalid
+    """
+    owner = data.get('consumerAddress')
+    body = dict()
+    body['providerAddress'] = provider_acc.address
+    body['owner'] = owner
+    if data.get('jobId') is not None:
+        body['jobId'] = data.get('jobId')
+    if data.get('serviceAgreementId') is not None:
+        body['agreementId'] = data.get('serviceAgreementId')
+
+    # Consumer signature
+    signature = data.get('signature')
+    original_msg = f'{body.get("owner", "")}{body.get("jobId", "")}{body.get("agreementId", "")}'
+    verify_signature(keeper_instance(), owner, signature, original_msg)
+    return body
+
+
+def _request_compute_status(body):
+    """Request the status of compute jobs from the operator service, signed by the provider."""
+    msg_to_sign = f'{provider_acc.address}{body.get("jobId", "")}{body.get("agreementId", "")}'
+    msg_hash = add_ethereum_prefix_and_hash_msg(msg_to_sign)
+    body['providerSignature'] = sign_hash(msg_hash, provider_acc)
+    return requests_session.get(
+        get_compute_endpoint(),
+        params=body,
+        headers={'content-type': 'application/json'})
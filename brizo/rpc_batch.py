@@ -0,0 +1,105 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import logging
+
+import requests
+from eth_abi import decode_abi
+from hexbytes import HexBytes
+from web3.utils.abi import get_abi_output_types, map_abi_data
+from web3.utils.contracts import find_matching_fn_abi
+from web3.utils.normalizers import BASE_RETURN_NORMALIZERS
+
+logger = logging.getLogger(__name__)
+
+
+class JsonRpcBatch:
+    """Send independent JSON-RPC calls to the keeper node in a single batch request.
+
+    Example::
+
+        batch = JsonRpcBatch(keeper_url)
+        block_number = batch.add('eth_blockNumber', [], decoder=lambda r: int(r, 16))
+        agreement = batch.add_contract_call(contract, 'getAgreement', agreement_id_bytes)
+        results = batch.execute()
+        results[block_number], results[agreement]
+    """
+
+    def __init__(self, url, session=None, timeout=30):
+        """
+        :param url: url of the keeper node, str
+        :param session: `requests.Session` reused across batches
+        :param timeout: request timeout in seconds, float
+        """
+        self._url = url
+        self._session = session if session is not None else requests
+        self._timeout = timeout
+        self._calls = []
+
+    def __len__(self):
+        return len(self._calls)
+
+    def add(self, method, params, decoder=None):
+        """Add a call to the batch.
+
+        :param method: JSON-RPC method name, str
+        :param params: list of params
+        :param decoder: function to apply on the result of the call
+        :return: index of the result of this call in the list returned by `execute()`, int
+        """
+        self._calls.append((method, params, decoder))
+        return len(self._calls) - 1
+
+    def add_contract_call(self, contract, fn_name, *args, block_identifier='latest'):
+        """Add an `eth_call` of a contract function, the result is decoded like a web3 call.
+
+        :param contract: web3 contract instance
+        :param fn_name: name of the contract function, str
+        :param args: the function arguments
+        :param block_identifier: block to execute the call at
+        :return: index of the result of this call in the list returned by `execute()`, int
+        """
+        fn_abi = find_matching_fn_abi(contract.abi, fn_name, args)
+        output_types = get_abi_output_types(fn_abi)
+
+        def _decode(result):
+            output = decode_abi(output_types, HexBytes(result))
+            output = map_abi_data(BASE_RETURN_NORMALIZERS, output_types, output)
+            return output[0] if len(output) == 1 else output
+
+        call_transaction = {
+            'to': contract.address,
+            'data': contract.encodeABI(fn_name=fn_name, args=list(args))
+        }
+        return self.add('eth_call', [call_transaction, block_identifier], _decode)
+
+    def execute(self):
+        """Send all the calls of the batch in one HTTP request.
+
+        :return: list of the results, in the order the calls were added
+        :raises ValueError: if any of the calls failed
+        """
+        if not self._calls:
+            return []
+
+        payload = [
+            {'jsonrpc': '2.0', 'id': i, 'method': method, 'params': params}
+            for i, (method, params, _) in enumerate(self._calls)
+        ]
+        response = self._session.post(self._url, json=payload, timeout=self._timeout)
+        response.raise_for_status()
+        responses = {item['id']: item for item in response.json()}
+
+        results = []
+        for i, (method, _, decoder) in enumerate(self._calls):
+            item = responses.get(i)
+            if item is None or 'error' in item:
+                error = item['error'] if item else 'no response'
+                raise ValueError(f'JSON-RPC call {method} failed: {error}')
+
+            result = item.get('result')
+            results.append(decoder(result) if decoder and result is not None else result)
+
+        logger.debug(f'executed a batch of {len(self._calls)} JSON-RPC calls')
+        self._calls = []
+        return results
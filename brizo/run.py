@@ -11,7 +11,7 @@ from brizo.config import Config
 from brizo.constants import BaseURLs, ConfigSections, Metadata
 from brizo.myapp import app
 from brizo.routes import services
-from brizo.util import keeper_instance, get_provider_account, get_latest_keeper_version
+from brizo.util import keeper_instance, get_provider_account, get_latest_keeper_version, get_stats
 
 config = Config(filename=app.config['CONFIG_FILE'])
 brizo_url = config.get(ConfigSections.RESOURCES, 'brizo.url')
@@ -45,6 +45,7 @@ def version():
     info['contracts']['ComputeExecutionCondition'] = keeper.compute_execution_condition.address
     info['keeper-version'] = get_latest_keeper_version()
     info['provider-address'] = get_provider_account().address
+    info['stats'] = get_stats()
     return jsonify(info)
 
 
@@ -0,0 +1,165 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import json
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from secret_store_client.client import Client, JSON_CONTENT
+
+logger = logging.getLogger(__name__)
+
+
+class SessionSecretStoreClient(Client):
+    """SecretStore client sending its requests through a keep-alive `requests.Session`.
+
+    `secret_store_client.Client` opens a new connection for each of the several requests
+    of a publish or decrypt, this client reuses the connections of its session instead.
+    """
+
+    def __init__(self, secret_store_url, parity_client_url, address, password):
+        Client.__init__(self, secret_store_url, parity_client_url, address, password)
+        self._session = requests.Session()
+
+    def close(self):
+        self._session.close()
+
+    def _rpc(self, method, params, error_message):
+        payload = json.dumps({
+            'jsonrpc': '2.0',
+            'method': method,
+            'params': params,
+            'id': 1
+        })
+        resp = self._session.post(self.parity_client_url, data=payload, headers=JSON_CONTENT)
+        self._handle_error(resp, error_message)
+        return resp.json()['result']
+
+    def _sign_document(self, document_id):
+        return self._rpc(
+            'secretstore_signRawHash',
+            [self.address, self.password, '0x' + document_id],
+            'Failed to sign the document'
+        )
+
+    def _generate_server_key(self, document_id, signed_document_key, threshold):
+        url = '{}/shadow/{}/{}/{}'.format(self.secret_store_url, document_id,
+                                          signed_document_key[2:], threshold)
+        resp = self._session.post(url)
+        self._handle_error(resp, 'Failed to generate server key')
+        return resp.json()
+
+    def _generate_document_key(self, server_key):
+        return self._rpc(
+            'secretstore_generateDocumentKey',
+            [self.address, self.password, server_key],
+            'Failed to generate the document key'
+        )
+
+    def _encrypt(self, encrypted_key, document_hex):
+        return self._rpc(
+            'secretstore_encrypt',
+            [self.address, self.password, encrypted_key, '0x' + document_hex],
+            'Failed to encrypt the document'
+        )
+
+    def _store_document_key(self, document_id, signed_document_id, encrypted_point, common_point):
+        url = '{}/shadow/{}/{}/{}/{}'.format(self.secret_store_url, document_id,
+                                             signed_document_id[2:], common_point[2:],
+                                             encrypted_point[2:])
+        resp = self._session.post(url)
+        self._handle_error(resp, 'Failed to store the document key')
+
+    def _get_decryption_keys(self, document_id, signed_document_id):
+        url = '{}/shadow/{}/{}'.format(self.secret_store_url, document_id, signed_document_id[2:])
+        resp = self._session.get(url)
+        self._handle_error(resp, 'Failed to retrieve decryption keys')
+        return resp.json()
+
+    def _decrypt(self, decrypted_secret, common_point, decrypted_shadows, encrypted_document):
+        return self._rpc(
+            'secretstore_shadowDecrypt',
+            [self.address, self.password, decrypted_secret, common_point, decrypted_shadows,
+             encrypted_document],
+            'Failed to decrypt the document'
+        )
+
+
+class SecretStorePool:
+    """Pool of long-lived SecretStore clients for one account.
+
+    The pool size is also the max number of concurrent SecretStore operations, callers
+    wait up to `timeout` seconds for a client to be released.
+    """
+
+    def __init__(self, secret_store_url, parity_url, address, password, size=4, timeout=30):
+        """
+        :param secret_store_url: url of the SecretStore, str
+        :param parity_url: url of the parity client, str
+        :param address: address of the account used by the clients, str
+        :param password: password of the account, str
+        :param size: max number of clients, int
+        :param timeout: max number of seconds to wait for a client, float
+        """
+        self._client_args = (secret_store_url, parity_url, address, password)
+        self._size = size
+        self._timeout = timeout
+        self._clients = queue.LifoQueue()
+        self._num_clients = 0
+        self._lock = threading.Lock()
+        self._num_acquired = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    @contextmanager
+    def client(self):
+        """Context manager lending a `SessionSecretStoreClient` of the pool."""
+        start = time.monotonic()
+        client = self._acquire()
+        wait = time.monotonic() - start
+        with self._lock:
+            self._num_acquired += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        if wait > 1:
+            logger.warning(f'Waited {wait:.3f}s for a SecretStore client, consider increasing '
+                           f'the SecretStore pool size ({self._size}).')
+
+        try:
+            yield client
+        finally:
+            self._clients.put(client)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self._size,
+                'clients': self._num_clients,
+                'idle': self._clients.qsize(),
+                'acquired': self._num_acquired,
+                'total_wait': self._total_wait,
+                'max_wait': self._max_wait
+            }
+
+    def _acquire(self):
+        try:
+            return self._clients.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._num_clients < self._size
+            if can_create:
+                self._num_clients += 1
+        if can_create:
+            return SessionSecretStoreClient(*self._client_args)
+
+        try:
+            return self._clients.get(timeout=self._timeout)
+        except queue.Empty:
+            raise TimeoutError(f'No SecretStore client was released in {self._timeout} seconds, '
+                               f'all {self._size} clients of the pool are busy.')
@@ -0,0 +1,162 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import logging
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+CONTENT_RANGE_PATTERN = re.compile(r'bytes (\d+)-(\d+)/(\d+)')
+
+
+class SegmentedDownloadError(Exception):
+    """The upstream file changed or failed while its segments were being downloaded."""
+
+
+def get_if_range_validator(headers):
+    """Return the validator of a response to send in `If-Range`, None if it has none.
+
+    :param headers: headers of the response, case insensitive dict
+    :return: the strong ETag or else the `Last-Modified` date, str
+    """
+    etag = headers.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('last-modified')
+
+
+class SegmentedDownload:
+    """Download an upstream file as concurrent ranged requests, reassembled in order.
+
+    Behaves like the streamed `requests.Response` of the whole file. The download starts
+    with a plain request of the file, its `Content-Length` gives the size of the file. Only
+    the files of at least `threshold` bytes whose upstream accepts byte ranges are segmented:
+    the first segment is read from that response, which is then closed, and the next
+    segments are downloaded by `parallelism` threads. At most `parallelism` segments are
+    downloaded ahead of the one being sent, this bounds the memory used by the reorder
+    buffer to `parallelism * segment_size` bytes.
+
+    The segments are requested with `If-Range` set to the strong ETag of the first
+    response, or to its `Last-Modified` date, so a file that changes during the download
+    fails instead of mixing two versions. Weak ETags cannot be used in `If-Range`.
+    """
+
+    def __init__(self, session, url, headers, segment_size, parallelism, threshold):
+        """
+        :param session: requests.Session
+        :param url: download url of the file, str
+        :param headers: headers of the upstream requests, dict
+        :param segment_size: size of the segments in bytes, int
+        :param parallelism: max number of segments downloaded at the same time, int
+        :param threshold: min size of the file in bytes to download its segments in parallel
+        """
+        self._session = session
+        self._url = url
+        self._headers = dict(headers)
+        self._segment_size = segment_size
+        self._parallelism = parallelism
+        self._threshold = threshold
+        self._executor = None
+        self._futures = deque()
+        self._responses = []
+        self._size = None
+        self.status_code = None
+        self.headers = CaseInsensitiveDict()
+
+    @classmethod
+    def open(cls, session, url, headers, segment_size, parallelism, threshold):
+        """Request the file, it is only segmented if it is large enough.
+
+        :return: a `SegmentedDownload`, or the upstream response itself if the file is
+            smaller than `threshold` or the upstream does not support ranges
+        """
+        download = cls(session, url, headers, segment_size, parallelism, threshold)
+        first_response = session.get(url, headers=download._headers, stream=True)
+        size = first_response.headers.get('content-length')
+        if (first_response.status_code != 200 or not size or not size.isdigit()
+                or int(size) < threshold
+                or first_response.headers.get('accept-ranges') != 'bytes'):
+            return first_response
+
+        download._responses.append(first_response)
+        download._size = int(size)
+        download.status_code = 200
+        download.headers = CaseInsensitiveDict(first_response.headers)
+        return download
+
+    def iter_content(self, chunk_size):
+        first_response = self._responses[0]
+        first_stop = min(self._segment_size, self._size)
+        if self._size <= first_stop:
+            yield from first_response.iter_content(chunk_size=chunk_size)
+            return
+
+        validator = get_if_range_validator(first_response.headers)
+        if validator:
+            self._headers['If-Range'] = validator
+
+        segments = iter([
+            (start, min(start + self._segment_size, self._size))
+            for start in range(first_stop, self._size, self._segment_size)
+        ])
+        self._executor = ThreadPoolExecutor(max_workers=self._parallelism)
+        for segment in segments:
+            self._futures.append(self._executor.submit(self._download_segment, *segment))
+            if len(self._futures) >= self._parallelism:
+                break
+
+        yield from self._iter_first_segment(first_response, first_stop, chunk_size)
+        while self._futures:
+            data = self._futures.popleft().result()
+            next_segment = next(segments, None)
+            if next_segment:
+                self._futures.append(self._executor.submit(self._download_segment, *next_segment))
+            for i in range(0, len(data), chunk_size):
+                yield data[i:i + chunk_size]
+
+    def close(self):
+        for future in self._futures:
+            future.cancel()
+        self._futures.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        for response in self._responses:
+            response.close()
+
+    @staticmethod
+    def _iter_first_segment(response, stop, chunk_size):
+        """Yield the first `stop` bytes of the full `response`, then close it."""
+        remaining = stop
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            chunk = chunk[:remaining]
+            remaining -= len(chunk)
+            yield chunk
+            if not remaining:
+                break
+        response.close()
+        if remaining:
+            raise SegmentedDownloadError(
+                f'Got {stop - remaining} bytes for the first segment 0-{stop - 1}.')
+
+    def _get_segment(self, start, stop):
+        response = self._session.get(
+            self._url, headers=dict(self._headers, Range=f'bytes={start}-{stop - 1}'))
+        match = CONTENT_RANGE_PATTERN.match(response.headers.get('content-range') or '')
+        if (response.status_code != 206 or not match
+                or (int(match.group(1)), int(match.group(2)) + 1) != (start, stop)):
+            response.close()
+            raise SegmentedDownloadError(
+                f'Unexpected response to the request of bytes {start}-{stop - 1} of the file, '
+                f'status {response.status_code}, the file may have changed.')
+        return response
+
+    def _download_segment(self, start, stop):
+        response = self._get_segment(start, stop)
+        if len(response.content) != stop - start:
+            raise SegmentedDownloadError(
+                f'Got {len(response.content)} bytes for the segment {start}-{stop - 1}.')
+        return response.content
@@ -0,0 +1,65 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import hmac
+import time
+
+
+class SessionTokenSigner:
+    """Issue and check the session tokens of consumers authorized under an agreement.
+
+    A token is `{did}.{expiry}.{mac}`, the HMAC-SHA256 `mac` binds it to the agreement id,
+    the consumer address, the did and the expiry. Checking a token is a local constant-time
+    comparison, it needs no chain read nor signature recovery.
+    """
+
+    def __init__(self, secret):
+        """
+        :param secret: HMAC key, the same for all the processes that check the tokens, str or
+            bytes
+        """
+        if not secret:
+            raise ValueError('The session tokens require a secret.')
+        self._secret = secret.encode() if isinstance(secret, str) else secret
+
+    def issue(self, agreement_id, consumer_address, did, expiry):
+        """
+        :param agreement_id: id of the agreement, hex str
+        :param consumer_address: address of the consumer, str
+        :param did: did of the asset, str
+        :param expiry: timestamp of the expiry of the token, int
+        :return: the token, str
+        """
+        expiry = int(expiry)
+        mac = self._mac(agreement_id, consumer_address, did, expiry)
+        return f'{did}.{expiry}.{mac}'
+
+    def verify(self, token, agreement_id, consumer_address):
+        """Return the did of a valid `token` of `consumer_address` for `agreement_id`, or None.
+
+        :param token: str
+        :param agreement_id: id of the agreement, hex str
+        :param consumer_address: address of the consumer, str
+        :return: did, str
+        """
+        parts = token.split('.') if isinstance(token, str) else []
+        if len(parts) != 3:
+            return None
+
+        did, expiry, mac = parts
+        try:
+            expiry = int(expiry)
+        except ValueError:
+            return None
+        if expiry < time.time():
+            return None
+
+        expected_mac = self._mac(agreement_id, consumer_address, did, expiry)
+        if not hmac.compare_digest(mac.encode(), expected_mac.encode()):
+            return None
+        return did
+
+    def _mac(self, agreement_id, consumer_address, did, expiry):
+        message = f'{agreement_id.lower()}|{consumer_address.lower()}|{did}|{expiry}'
+        return hmac.new(self._secret, message.encode(), hashlib.sha256).hexdigest()
@@ -0,0 +1,76 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import calendar
+import logging
+import time
+from datetime import datetime
+from urllib.parse import parse_qs, urlparse
+
+from brizo.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def get_signed_url_expiry(signed_url):
+    """Return the expiry timestamp of a pre-signed url, or None if it has no known expiry.
+
+    Supported are Azure SAS urls (`se`), AWS signature v4 urls (`X-Amz-Date` and
+    `X-Amz-Expires`) and AWS signature v2 urls (`Expires`).
+
+    :param signed_url: the pre-signed url, str
+    :return: timestamp, float
+    """
+    params = {k.lower(): v[0] for k, v in parse_qs(urlparse(signed_url).query).items()}
+    try:
+        if 'se' in params:
+            expiry = params['se']
+            for fmt in ('%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%MZ', '%Y-%m-%d'):
+                try:
+                    return calendar.timegm(datetime.strptime(expiry, fmt).timetuple())
+                except ValueError:
+                    pass
+        elif 'x-amz-date' in params and 'x-amz-expires' in params:
+            signed_at = datetime.strptime(params['x-amz-date'], '%Y%m%dT%H%M%SZ')
+            return calendar.timegm(signed_at.timetuple()) + int(params['x-amz-expires'])
+        elif 'expires' in params:
+            return int(params['expires'])
+    except ValueError as e:
+        logger.debug(f'Invalid expiry in signed url: {e}')
+
+    return None
+
+
+class SignedUrlCache:
+    """Cache of the download urls generated by the Osmosis drivers, keyed by the asset url.
+
+    Only pre-signed urls with a known expiry are cached, each one is dropped `margin` seconds
+    before it expires so that a consumer never gets a url about to expire.
+    """
+
+    def __init__(self, maxsize, margin):
+        """
+        :param maxsize: max number of cached urls, int
+        :param margin: number of seconds before the expiry of a url when it is dropped, float
+        """
+        self._cache = TTLCache(maxsize, 0)
+        self._margin = margin
+
+    def stats(self):
+        return self._cache.stats()
+
+    def get_or_sign(self, url, sign):
+        """Return the download url of `url`, calling `sign(url)` only if it is not cached.
+
+        :param url: url of the asset file, str
+        :param sign: function generating the download url of a url
+        :return: the download url, str
+        """
+        return self._cache.get_or_load(url, lambda: sign(url), ttl=self._get_ttl)
+
+    def _get_ttl(self, signed_url):
+        expiry = get_signed_url_expiry(signed_url)
+        if expiry is None:
+            return 0
+
+        return expiry - time.time() - self._margin
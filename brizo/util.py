@@ -1,31 +1,84 @@
-import io
 import json
 import logging
 import mimetypes
 import os
+import signal
 import site
+import threading
+import uuid
 from cgi import parse_header
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from os import getenv
+from urllib.parse import unquote, urlparse
 
-from eth_utils import remove_0x_prefix
-from flask import Response
+from eth_account import Account as EthAccount
+from eth_utils import add_0x_prefix, remove_0x_prefix
+from flask import Response, redirect, send_file
 from ocean_keeper import Keeper
+from ocean_keeper.account import Account
+from ocean_keeper.agreements.agreement_manager import AgreementValues
 from ocean_keeper.contract_handler import ContractHandler
 from ocean_keeper.event_filter import EventFilter
 from ocean_keeper.utils import add_ethereum_prefix_and_hash_msg, get_account
 from ocean_keeper.web3_provider import Web3Provider
 from ocean_utils.agreements.service_types import ServiceTypes
-from ocean_utils.did import did_to_id
-from ocean_utils.did_resolver.did_resolver import DIDResolver
-from osmosis_driver_interface.osmosis import Osmosis
-from secret_store_client.client import Client as SecretStore
-
+from ocean_utils.did import did_to_id, id_to_did
+from ocean_utils.http_requests.requests_session import get_requests_session
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.http import is_resource_modified, parse_date, unquote_etag
+
+from brizo.agreement_index import AgreementActorsIndex
+from brizo.archive import stream_zip_archive
+from brizo.cache import TTLCache
+from brizo.checksum import ChecksumStats, verify_content
 from brizo.config import Config
 from brizo.constants import BaseURLs
+from brizo.crypto import SignatureBackend
+from brizo.content_cache import ContentCache
+from brizo.ddo_cache import DDOCache
 from brizo.exceptions import InvalidSignatureError, ServiceAgreementExpired
+from brizo.files_cache import DecryptedFilesCache
+from brizo.job_status import JobStatusHub
+from brizo.osmosis_registry import OsmosisDriverRegistry
+from brizo.rpc_batch import JsonRpcBatch
+from brizo.secret_store import SecretStorePool
+from brizo.segmented_download import SegmentedDownload
+from brizo.session_token import SessionTokenSigner
+from brizo.signed_url_cache import SignedUrlCache, get_signed_url_expiry
 
 logger = logging.getLogger(__name__)
+audit_logger = logging.getLogger('brizo.audit')
+
+# Headers of the consume requests sent with the requests of the file to the upstream, and
+# headers of the upstream responses sent to the consumer.
+FORWARDED_REQUEST_HEADERS = ('Range', 'If-Range', 'If-None-Match', 'If-Modified-Since')
+CONDITIONAL_REQUEST_HEADERS = ('If-Range', 'If-None-Match', 'If-Modified-Since')
+PROPAGATED_RESPONSE_HEADERS = ('Accept-Ranges', 'Content-Length', 'Content-Range', 'ETag',
+                               'Last-Modified')
+# Header of the session tokens of the consume requests and responses.
+SESSION_TOKEN_HEADER = 'X-Brizo-Session-Token'
+
+_agreement_actors_index = None
+_ddo_cache = None
+_files_cache = None
+_authorization_cache = None
+_auth_token_cache = None
+_signature_backend = None
+_provider_signer = None
+_session_token_signer = None
+_job_status_hub = None
+_signed_url_cache = None
+_content_cache = None
+_checksum_stats = ChecksumStats()
+_secret_store_pools = dict()
+_secret_store_pools_lock = threading.Lock()
+# Timestamps of final blocks.
+_block_times = TTLCache(10000, 24 * 3600)
+_config_lock = threading.Lock()
+_config_snapshot = None
+_osmosis_registry = OsmosisDriverRegistry()
+_rpc_session = get_requests_session()
 
 
 def setup_keeper(config_file=None):
@@ -63,8 +116,69 @@ def init_account_envvars():
 
 
 def get_config():
+    """Return the process-wide config, it is parsed again only when the config file changes."""
+    global _config_snapshot
     config_file = os.getenv('CONFIG_FILE', 'config.ini')
-    return Config(filename=config_file)
+    key = (config_file, os.stat(config_file).st_mtime_ns)
+    snapshot = _config_snapshot
+    if snapshot is not None and snapshot[0] == key:
+        return snapshot[1]
+
+    with _config_lock:
+        if _config_snapshot is None or _config_snapshot[0] != key:
+            config = Config(filename=config_file)
+            config.freeze()
+            if _config_snapshot is not None:
+                _reset_config_components()
+            _config_snapshot = (key, config)
+            logger.debug(f'Loaded config file {config_file}')
+
+        return _config_snapshot[1]
+
+
+def reload_config(*_):
+    """Drop the cached config so that the next `get_config()` reads the config file again."""
+    global _config_snapshot
+    _config_snapshot = None
+    _reset_config_components()
+
+
+def _reset_config_components():
+    """Drop the components built from the config, they are built again on their next use.
+
+    The agreement actors index keeps syncing in the background and the provider key stays
+    unlocked, changing their settings requires a restart.
+    """
+    global _ddo_cache, _files_cache, _authorization_cache, _auth_token_cache, \
+        _signature_backend, _session_token_signer, _job_status_hub, _signed_url_cache, \
+        _content_cache
+    _ddo_cache = None
+    _files_cache = None
+    _authorization_cache = None
+    _auth_token_cache = None
+    _signature_backend = None
+    _session_token_signer = None
+    _job_status_hub = None
+    _signed_url_cache = None
+    _content_cache = None
+    # No lock is taken, this also runs in the SIGHUP handler.
+    _secret_store_pools.clear()
+    _osmosis_registry.clear()
+
+
+def install_config_reload_handler():
+    """Reload the config on SIGHUP, this is only possible from the main thread."""
+    if threading.current_thread() is not threading.main_thread() or not hasattr(signal, 'SIGHUP'):
+        return
+
+    previous_handler = signal.getsignal(signal.SIGHUP)
+
+    def _handler(signum, frame):
+        reload_config()
+        if callable(previous_handler):
+            previous_handler(signum, frame)
+
+    signal.signal(signal.SIGHUP, _handler)
 
 
 def get_request_data(request, url_params_only=False):
@@ -73,27 +187,30 @@ def get_request_data(request, url_params_only=False):
     return request.args if request.args else request.json
 
 
+def get_secret_store_pool(config, account):
+    key = (config.secret_store_url, config.parity_url, account.address, account.password)
+    with _secret_store_pools_lock:
+        if key not in _secret_store_pools:
+            _secret_store_pools[key] = SecretStorePool(
+                *key,
+                size=config.secret_store_pool_size,
+                timeout=config.secret_store_pool_timeout
+            )
+
+        return _secret_store_pools[key]
+
+
 def do_secret_store_encrypt(did_id, document, provider_acc, config):
-    secret_store = SecretStore(
-        config.secret_store_url,
-        config.parity_url,
-        provider_acc.address,
-        provider_acc.password
-    )
-    encrypted_document = secret_store.publish_document(did_id, document)
+    with get_secret_store_pool(config, provider_acc).client() as secret_store:
+        encrypted_document = secret_store.publish_document(did_id, document)
     return encrypted_document
 
 
 def do_secret_store_decrypt(did_id, encrypted_document, provider_acc, config):
-    secret_store = SecretStore(
-        config.secret_store_url,
-        config.parity_url,
-        provider_acc.address,
-        provider_acc.password
-    )
-    return secret_store.decrypt_document(
-        did_id, encrypted_document
-    )
+    with get_secret_store_pool(config, provider_acc).client() as secret_store:
+        return secret_store.decrypt_document(
+            did_id, encrypted_document
+        )
 
 
 def _get_agreement_actor_event(keeper, agreement_id, from_block=0, to_block='latest'):
@@ -110,68 +227,214 @@ def _get_agreement_actor_event(keeper, agreement_id, from_block=0, to_block='lat
     return event_filter
 
 
-def is_access_granted(agreement_id, did, consumer_address, keeper):
-    event_logs = _get_agreement_actor_event(keeper, agreement_id).get_all_entries()
-    if not event_logs:
-        return False
+def get_agreement_actors_index():
+    global _agreement_actors_index
+    if _agreement_actors_index is None:
+        config = get_config()
+        if not config.agreement_index_path:
+            return None
 
-    actors = [log.args.actor for log in event_logs]
-    if not actors:
-        return False
+        _agreement_actors_index = AgreementActorsIndex(
+            config.agreement_index_path,
+            from_block=config.agreement_index_from_block,
+            confirmations=config.block_confirmations,
+            scan_chunk_blocks=config.agreement_index_scan_chunk_blocks
+        )
+        _agreement_actors_index.start(keeper_instance(), config.agreement_index_sync_interval)
 
-    if consumer_address not in actors:
-        logger.warning(f'Invalid consumer address {consumer_address} and/or '
-                       f'service agreement id {agreement_id} (did {did})'
-                       f', agreement actors are {actors}')
-        return False
+    return _agreement_actors_index
+
+
+def get_ddo_cache():
+    global _ddo_cache
+    if _ddo_cache is None:
+        config = get_config()
+        _ddo_cache = DDOCache(config.ddo_cache_size, config.ddo_cache_ttl)
+
+    return _ddo_cache
 
-    document_id = did_to_id(did)
-    return keeper.access_secret_store_condition.check_permissions(
-        document_id, consumer_address
-    )
 
+def resolve_asset(did, keeper):
+    return get_ddo_cache().resolve(keeper, did)
+
+
+def get_agreement_actors(keeper, agreement_id, latest_block=None):
+    actors_index = get_agreement_actors_index()
+    if actors_index is not None:
+        return actors_index.get_actors(keeper, agreement_id, latest_block)
 
-def validate_agreement_condition(agreement_id, did, consumer_address, keeper):
     event_logs = _get_agreement_actor_event(keeper, agreement_id).get_all_entries()
-    if not event_logs:
-        return False
+    return [log.args.actor for log in event_logs]
+
+
+def get_authorization_cache():
+    global _authorization_cache
+    if _authorization_cache is None:
+        config = get_config()
+        _authorization_cache = TTLCache(
+            config.authorization_cache_size, config.authorization_cache_negative_ttl)
+
+    return _authorization_cache
+
+
+def get_agreement_authorization(keeper, agreement_id, consumer_address, service_type,
+                                context=None):
+    """Read the agreement and check that `consumer_address` is authorized under it.
+
+    Once the condition is fulfilled the permission cannot be revoked, so a granted
+    authorization is cached until the service agreement expires (at most
+    `authorization_cache.max_ttl` seconds). A denied authorization is cached for
+    `authorization_cache.negative_ttl` seconds only, since the condition may be fulfilled
+    shortly after.
+
+    :param keeper: Keeper instance
+    :param agreement_id: id of the agreement, hex str
+    :param consumer_address: address of the consumer, str
+    :param service_type: `ServiceTypes.ASSET_ACCESS` or `ServiceTypes.CLOUD_COMPUTE`
+    :param context: `RequestContext` of the request, if any
+    :return: tuple (agreement, is_authorized, block_time)
+    """
+    config = context.config if context else get_config()
+
+    def _authorization_ttl(authorization):
+        agreement, is_authorized, block_time = authorization
+        if not is_authorized:
+            return None
+
+        try:
+            did = id_to_did(agreement.did)
+            asset = context.resolve_asset(did) if context else resolve_asset(did, keeper)
+            service = asset.get_service(service_type) if asset else None
+        except Exception as e:
+            logger.warning(f'Failed to resolve the asset of agreement {agreement_id}: {e}')
+            service = None
+        if service is None:
+            return 0
+
+        max_ttl = config.authorization_cache_max_ttl
+        expiry_time = get_agreement_expiry_time(service, block_time)
+        if expiry_time is None:
+            return max_ttl
+        return min(expiry_time - datetime.now().timestamp(), max_ttl)
+
+    key = (agreement_id.lower(), consumer_address, service_type)
+    return get_authorization_cache().get_or_load(
+        key,
+        lambda: _read_agreement_authorization(
+            keeper, agreement_id, consumer_address, service_type, config),
+        ttl=_authorization_ttl
+    )
+
 
-    actors = [log.args.actor for log in event_logs]
-    if not actors:
-        return False
+def _read_agreement_authorization(keeper, agreement_id, consumer_address, service_type, config):
+    """Read the agreement and the permission of `consumer_address` from the chain.
 
-    if consumer_address not in actors:
+    The independent chain reads are grouped into two JSON-RPC batch requests, the agreement
+    with the latest block number first, then the condition permission with the agreement
+    block time.
+
+    :param keeper: Keeper instance
+    :param agreement_id: id of the agreement, hex str
+    :param consumer_address: address of the consumer, str
+    :param service_type: `ServiceTypes.ASSET_ACCESS` or `ServiceTypes.CLOUD_COMPUTE`
+    :param config: Config instance
+    :return: tuple (agreement, is_authorized, block_time)
+    """
+    w3 = Web3Provider.get_web3()
+    batch = JsonRpcBatch(config.keeper_url, _rpc_session)
+    batch.add_contract_call(
+        keeper.agreement_manager.contract, 'getAgreement', w3.toBytes(hexstr=agreement_id))
+    batch.add('eth_blockNumber', [], decoder=lambda result: int(result, 16))
+    agreement_values, latest_block = batch.execute()
+
+    did_bytes, owner, template_id, condition_ids, updated_by, block_number = agreement_values
+    agreement = AgreementValues(
+        add_0x_prefix(did_bytes.hex()),
+        owner,
+        add_0x_prefix(template_id.hex()),
+        [add_0x_prefix(_id.hex()) for _id in condition_ids],
+        updated_by,
+        block_number
+    )
+    if not block_number:
+        logger.warning(f'Service agreement {agreement_id} was not found.')
+        return agreement, False, None
+
+    did = id_to_did(agreement.did)
+    actors = get_agreement_actors(keeper, agreement_id, latest_block)
+    is_actor = consumer_address in actors
+    if not is_actor:
         logger.warning(f'Invalid consumer address {consumer_address} and/or '
                        f'service agreement id {agreement_id} (did {did})'
                        f', agreement actors are {actors}')
-        return False
 
-    document_id = did_to_id(did)
-    return keeper.compute_execution_condition.was_compute_triggered(
-        document_id, consumer_address
-    )
+    permission_call = None
+    if is_actor:
+        document_id = w3.toBytes(hexstr=did_to_id(did))
+        if service_type == ServiceTypes.CLOUD_COMPUTE:
+            permission_call = batch.add_contract_call(
+                keeper.compute_execution_condition.contract, 'wasComputeTriggered',
+                document_id, consumer_address)
+        else:
+            permission_call = batch.add_contract_call(
+                keeper.access_secret_store_condition.contract, 'checkPermissions',
+                consumer_address, document_id)
+
+    block_time = _block_times.get(block_number)
+    block_time_call = None
+    if block_time is None:
+        block_time_call = batch.add(
+            'eth_getBlockByNumber', [hex(block_number), False],
+            decoder=lambda block: int(block['timestamp'], 16))
+
+    results = batch.execute()
+    is_authorized = bool(results[permission_call]) if permission_call is not None else False
+    if block_time_call is not None:
+        block_time = results[block_time_call]
+        if is_block_final(block_number, latest_block):
+            _block_times.set(block_number, block_time)
+
+    return agreement, is_authorized, block_time
 
 
 def is_token_valid(token):
     return isinstance(token, str) and token.startswith('0x') and len(token.split('-')) == 2
 
 
+def get_auth_token_cache():
+    global _auth_token_cache
+    if _auth_token_cache is None:
+        _auth_token_cache = TTLCache(get_config().auth_token_cache_size, 0)
+
+    return _auth_token_cache
+
+
 def check_auth_token(token):
-    w3 = web3()
+    """Return the checksum address that signed the auth `token`, or '0x0' if it expired.
+
+    The address recovered from a token is cached until the token expires, so a client
+    reusing its token pays the signature recovery once.
+    """
     parts = token.split('-')
     if len(parts) < 2:
         return '0x0'
     # :HACK: alert, this should be part of ocean-utils, ocean-keeper, or a stand-alone library
     sig, timestamp = parts
-    auth_token_message = get_config().auth_token_message or "Ocean Protocol Authentication"
+    config = get_config()
+    auth_token_message = config.auth_token_message or "Ocean Protocol Authentication"
     default_exp = 24 * 60 * 60
-    expiration = int(get_config().auth_token_expiration or default_exp)
-    if int(datetime.now().timestamp()) > (int(timestamp) + expiration):
+    expiration = int(config.auth_token_expiration or default_exp)
+    expiry = int(timestamp) + expiration
+    if int(datetime.now().timestamp()) > expiry:
         return '0x0'
 
-    message = f'{auth_token_message}\n{timestamp}'
-    address = Keeper.personal_ec_recover(message, sig)
-    return w3.toChecksumAddress(address)
+    def _recover_address():
+        message = f'{auth_token_message}\n{timestamp}'
+        return get_signature_backend().personal_recover(message, sig)
+
+    return get_auth_token_cache().get_or_load(
+        (token, auth_token_message), _recover_address,
+        ttl=expiry - datetime.now().timestamp())
 
 
 def generate_token(account):
@@ -179,14 +442,128 @@ def generate_token(account):
     _time = int(datetime.now().timestamp())
     _message = f'{raw_msg}\n{_time}'
     prefixed_msg_hash = add_ethereum_prefix_and_hash_msg(_message)
-    return f'{keeper_instance().sign_hash(prefixed_msg_hash, account)}-{_time}'
+    return f'{sign_hash(prefixed_msg_hash, account)}-{_time}'
+
+
+def get_signature_backend():
+    global _signature_backend
+    if _signature_backend is None:
+        _signature_backend = SignatureBackend(get_config().signature_backend)
+
+    return _signature_backend
+
+
+def unlock_provider_key(account):
+    """Decrypt the encrypted key of the provider account once, for all the provider signatures.
+
+    The keystore KDF takes hundreds of milliseconds, `sign_hash` then uses the decrypted key
+    instead of decrypting it on every signature. The account itself is left unchanged, its
+    password is still used by the SecretStore. Nothing is done if the account has a plain
+    private key, or if `provider_key.unlock` is off.
+
+    :param account: provider Account instance
+    """
+    global _provider_signer
+    _provider_signer = None
+    if not get_config().provider_key_unlock or not account.password:
+        return
+
+    private_key = EthAccount.decrypt(account.key, account.password)
+    if EthAccount.privateKeyToAccount(private_key).address.lower() != account.address.lower():
+        raise AssertionError(f'The key of the provider account does not match its address '
+                             f'{account.address}.')
+
+    _provider_signer = Account(account.address, private_key=private_key)
+    logger.info(f'Unlocked the key of the provider account {account.address}.')
+
+
+def sign_hash(msg_hash, account):
+    """Sign `msg_hash` with the key of `account`, like `Keeper.sign_hash`.
+
+    :param msg_hash: hash to sign, bytes or hex str
+    :param account: Account instance
+    :return: signature, hex str
+    """
+    signer = _provider_signer
+    if signer is not None and signer.address == account.address:
+        account = signer
+
+    private_key = account.key
+    if account.password:
+        private_key = EthAccount.decrypt(account.key, account.password)
+    return get_signature_backend().sign_hash(msg_hash, private_key)
+
+
+def get_session_token_signer():
+    global _session_token_signer
+    if _session_token_signer is None:
+        _session_token_signer = SessionTokenSigner(get_config().session_token_secret)
+
+    return _session_token_signer
+
+
+def setup_session_tokens():
+    """Check that the session tokens have a secret when they are enabled.
+
+    The secret must be shared by all the workers and instances of Brizo, a token is checked
+    by whichever of them gets the next request of the consumer.
+    """
+    config = get_config()
+    if config.session_token_ttl > 0 and not config.session_token_secret:
+        raise AssertionError(f'The session tokens are enabled but have no secret. Please set '
+                             f'`session_token.secret` or the environment variable '
+                             f'`SESSION_TOKEN_SECRET`, or disable them with '
+                             f'`session_token.ttl = 0`.')
+
+
+def issue_session_token(agreement_id, consumer_address, did, service_agreement, block_time):
+    """Return a session token of a consumer whose access was fully verified, or None if the
+    session tokens are disabled.
+
+    The token expires after `session_token.ttl` seconds, and at the latest when the agreement
+    expires.
+
+    :param agreement_id: id of the agreement, hex str
+    :param consumer_address: address of the consumer, str
+    :param did: did of the asset, str
+    :param service_agreement: the access service of the asset
+    :param block_time: timestamp of the block of the agreement, int
+    :return: str
+    """
+    ttl = get_config().session_token_ttl
+    if ttl <= 0:
+        return None
+
+    expiry = datetime.now().timestamp() + ttl
+    agreement_expiry = get_agreement_expiry_time(service_agreement, block_time)
+    if agreement_expiry is not None:
+        expiry = min(expiry, agreement_expiry)
+    return get_session_token_signer().issue(agreement_id, consumer_address, did, expiry)
+
+
+def verify_session_token(token, agreement_id, consumer_address):
+    """Return the did the session `token` grants `consumer_address` access to under
+    `agreement_id`, or None if it is invalid, expired or the session tokens are disabled."""
+    if not token or get_config().session_token_ttl <= 0:
+        return None
+
+    return get_session_token_signer().verify(token, agreement_id, consumer_address)
+
+
+def add_session_token_header(response, session_token):
+    if session_token:
+        response.headers[SESSION_TOKEN_HEADER] = session_token
+        exposed = response.headers.get('Access-Control-Expose-Headers')
+        response.headers['Access-Control-Expose-Headers'] = \
+            f'{exposed}, {SESSION_TOKEN_HEADER}' if exposed else SESSION_TOKEN_HEADER
+    return response
 
 
 def verify_signature(keeper, signer_address, signature, original_msg):
     if is_token_valid(signature):
         address = check_auth_token(signature)
     else:
-        address = keeper.personal_ec_recover(original_msg, signature)
+        address = get_signature_backend().personal_recover(original_msg, signature)
 
     if address.lower() == signer_address.lower():
         return True
@@ -246,20 +623,22 @@ def get_metadata(ddo):
         logger.error("Error getting the metatada: %s" % e)
 
 
-def get_agreement_block_time(agreement_id):
-    # get starting time from the on-chain agreement's blocknumber
-    keeper = keeper_instance()
-    w3 = Web3Provider.get_web3()
-    agreement = keeper.agreement_manager.get_agreement(agreement_id)
-    block_time = w3.eth.getBlock(agreement.block_number_updated).timestamp
-    return int(block_time)
+def is_block_final(block_number, latest_block):
+    return latest_block - block_number >= get_config().block_confirmations
 
 
-def validate_agreement_expiry(service_agreement, start_time):
+def get_agreement_expiry_time(service_agreement, start_time):
+    """Return the expiry timestamp of the agreement, or None if it never expires."""
     timeout = int(service_agreement.attributes['main'].get('timeout', 3600 * 24))
     if timeout == 0:
+        return None
+    return start_time + timeout
+
+
+def validate_agreement_expiry(service_agreement, start_time):
+    expiry_time = get_agreement_expiry_time(service_agreement, start_time)
+    if expiry_time is None:
         return True
-    expiry_time = start_time + timeout
     current_time = datetime.now().timestamp()
     if current_time > expiry_time:
         agreement_exp = datetime.fromtimestamp(expiry_time).replace(microsecond=0).isoformat()
@@ -269,49 +648,172 @@ def validate_agreement_expiry(service_agreement, start_time):
     return True
 
 
-def build_download_response(request, requests_session, url, download_url, content_type):
+def get_download_file_info(url, response_headers, content_type):
+    """Return the filename and the content type of a downloaded file.
+
+    :param url: source url of the file, str
+    :param response_headers: headers of the upstream response
+    :param content_type: content type of the file in the DDO, str
+    :return: tuple (filename, content_type)
+    """
+    filename = url.split("/")[-1]
+
+    content_disposition_header = response_headers.get('content-disposition')
+    if content_disposition_header:
+        _, content_disposition_params = parse_header(content_disposition_header)
+        content_filename = content_disposition_params.get('filename')
+        if content_filename:
+            filename = content_filename
+
+    content_type_header = response_headers.get('content-type')
+    if content_type_header:
+        content_type = content_type_header
+
+    file_ext = os.path.splitext(filename)[1]
+    if file_ext and not content_type:
+        content_type = mimetypes.guess_type(filename)[0]
+    elif not file_ext and content_type:
+        # add an extension to filename based on the content_type
+        extension = mimetypes.guess_extension(content_type)
+        if extension:
+            filename = filename + extension
+
+    return filename, content_type
+
+
+def get_content_cache():
+    global _content_cache
+    if _content_cache is None:
+        config = get_config()
+        if config.content_cache_path:
+            _content_cache = ContentCache(config.content_cache_path, config.content_cache_max_bytes)
+
+    return _content_cache
+
+
+def get_stats():
+    """Return the counters of the caches, the SecretStore pools and the checksum checks of
+    this worker process.
+
+    Only the components already in use are reported, none is created here.
+    """
+    stats = dict()
+    components = (
+        ('ddo_cache', _ddo_cache),
+        ('files_cache', _files_cache),
+        ('authorization_cache', _authorization_cache),
+        ('auth_token_cache', _auth_token_cache),
+        ('signed_url_cache', _signed_url_cache),
+        ('content_cache', _content_cache)
+    )
+    for name, component in components:
+        if component is not None:
+            stats[name] = component.stats()
+
+    with _secret_store_pools_lock:
+        pools = list(_secret_store_pools.values())
+    stats['secret_store_pools'] = [pool.stats() for pool in pools]
+    stats['checksums'] = _checksum_stats.stats()
+    return stats
+
+
+def build_download_response(request, requests_session, url, download_url, content_type,
+                            file_attributes=None, allow_local_file=False):
+    """Stream the file at `download_url` to the consumer.
+
+    :param request: the consume request
+    :param requests_session: requests.Session used to download the file
+    :param url: url of the asset file, str
+    :param download_url: url the file is downloaded from, e.g. its pre-signed url, str
+    :param content_type: content type of the asset metadata, str
+    :param file_attributes: the file entry of `metadata.main.files` of the DDO, its
+        `checksum` and `contentLength` are verified when `consume.verify_checksum` is on, dict
+    :param allow_local_file: whether the file can be served from `local_files.roots`. Only for
+        the urls of the decrypted files list of the asset, never for a url of the consumer.
+    :return: Response
+    """
     try:
-        download_request_headers = {}
-        download_response_headers = {}
-
         is_range_request = bool(request.range)
 
-        if is_range_request:
-            download_request_headers = {"Range": request.headers.get('range')}
-            download_response_headers = download_request_headers
-
-        response = requests_session.get(download_url, headers=download_request_headers, stream=True)
-
-        if not is_range_request:
-            filename = url.split("/")[-1]
-
-            content_disposition_header = response.headers.get('content-disposition')
-            if content_disposition_header:
-                _, content_disposition_params = parse_header(content_disposition_header)
-                content_filename = content_disposition_params.get('filename')
-                if content_filename:
-                    filename = content_filename
-
-            content_type_header = response.headers.get('content-type')
-            if content_type_header:
-                content_type = content_type_header
-
-            file_ext = os.path.splitext(filename)[1]
-            if file_ext and not content_type:
-                content_type = mimetypes.guess_type(filename)[0]
-            elif not file_ext and content_type:
-                # add an extension to filename based on the content_type
-                extension = mimetypes.guess_extension(content_type)
-                if extension:
-                    filename = filename + extension
-
-            download_response_headers = {
-                "Content-Disposition": f'attachment;filename={filename}',
-                "Access-Control-Expose-Headers": f'Content-Disposition'
-            }
+        local_path = None
+        if allow_local_file:
+            local_path = get_local_file_path(download_url, get_config().local_files_roots)
+        if local_path:
+            filename, content_type = get_download_file_info(url, {}, content_type)
+            return build_file_response(request, local_path, filename, content_type)
+
+        # The upstream handles the ranges and the conditional requests of the consumer, the
+        # content is not encoded so that the byte ranges and lengths stay valid.
+        download_request_headers = {'Accept-Encoding': 'identity'}
+        for header in FORWARDED_REQUEST_HEADERS:
+            value = request.headers.get(header)
+            if value:
+                download_request_headers[header] = value
+        is_conditional_request = any(
+            header in download_request_headers for header in CONDITIONAL_REQUEST_HEADERS)
+
+        content_cache = get_content_cache()
+        cached = None
+        if content_cache and not is_conditional_request:
+            cached = content_cache.get(url)
+        if cached:
+            download_request_headers.update(cached.validation_headers())
+
+        config = get_config()
+        if config.segmented_download_threshold > 0 and not is_range_request and not cached:
+            response = SegmentedDownload.open(
+                requests_session, download_url, download_request_headers,
+                config.segmented_download_segment_size, config.segmented_download_parallelism,
+                config.segmented_download_threshold)
+        else:
+            response = requests_session.get(
+                download_url, headers=download_request_headers, stream=True)
+
+        if content_cache:
+            is_hit = bool(cached) and response.status_code == 304
+            content_cache.record_hit(is_hit)
+            if is_hit:
+                response.close()
+                return build_file_response(
+                    request, cached.path, cached.filename, cached.content_type,
+                    validators=cached.metadata)
+            if cached:
+                logger.debug(f'{url} changed upstream, removing it from the content cache.')
+                content_cache.remove(url)
+
+        upstream_content_type = response.headers.get('content-type') or ''
+        is_multipart = upstream_content_type.startswith('multipart/byteranges')
+        file_headers = response.headers
+        if is_multipart:
+            file_headers = {k: v for k, v in response.headers.items() if k.lower() != 'content-type'}
+        filename, content_type = get_download_file_info(url, file_headers, content_type)
+        if is_multipart:
+            content_type = upstream_content_type
+
+        download_response_headers = {
+            "Content-Disposition": f'attachment;filename={filename}',
+            "Access-Control-Expose-Headers": f'Content-Disposition'
+        }
+        for header in PROPAGATED_RESPONSE_HEADERS:
+            value = response.headers.get(header.lower())
+            if value:
+                download_response_headers[header] = value
+
+        content = stream_response_content(response, config.download_chunk_size)
+        if config.consume_verify_checksum and file_attributes and response.status_code == 200:
+            content = verify_content(
+                content, file_attributes, url.split('?')[0], _checksum_stats)
+        if (content_cache and not is_range_request and response.status_code == 200
+                and content_cache.can_cache(response.headers)):
+            content = content_cache.stream_and_store(url, content, {
+                'etag': response.headers.get('etag'),
+                'last_modified': response.headers.get('last-modified'),
+                'content_type': content_type,
+                'filename': filename
+            })
 
         return Response(
-            io.BytesIO(response.content).read(),
+            content,
             response.status_code,
             headers=download_response_headers,
             content_type=content_type
@@ -321,13 +823,335 @@ def build_download_response(request, requests_session, url, download_url, conten
         raise
 
 
+def build_file_response(request, path, filename, content_type, validators=None):
+    """Serve a local file with the Range and conditional requests semantics of the upstream
+    downloads.
+
+    `send_file` uses the `wsgi.file_wrapper` of the server (sendfile) when there is one, a
+    request with several ranges gets a `multipart/byteranges` response.
+
+    :param request: the consume request
+    :param path: path of the file, str
+    :param filename: filename of the Content-Disposition header, str
+    :param content_type: str
+    :param validators: dict with the `etag` and `last_modified` of the file upstream, for
+        files of the content cache. Local files are validated by their mtime and size.
+    :return: Response
+    """
+    response = send_file(path, mimetype=content_type, add_etags=validators is None)
+    # The files are only available to authorized consumers, they must not be cached by proxies.
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers.pop('Expires', None)
+    if validators is not None:
+        if validators.get('etag'):
+            response.set_etag(*unquote_etag(validators['etag']))
+        last_modified = parse_date(validators.get('last_modified'))
+        if last_modified is None:
+            response.headers.pop('Last-Modified', None)
+        else:
+            response.last_modified = last_modified
+
+    response.headers['Content-Disposition'] = f'attachment;filename={filename}'
+    response.headers['Access-Control-Expose-Headers'] = 'Content-Disposition'
+
+    size = os.path.getsize(path)
+    ranges = request.range.ranges if request.range else []
+    if len(ranges) > 1 and _is_if_range_satisfied(request, response):
+        etag = response.get_etag()[0]
+        if not is_resource_modified(request.environ, etag, last_modified=response.last_modified):
+            return response.make_conditional(request)
+
+        response.close()
+        return build_multipart_ranges_response(
+            path, ranges, size, response.mimetype or content_type, response.headers)
+
+    try:
+        return response.make_conditional(request, accept_ranges=True, complete_length=size)
+    except RequestedRangeNotSatisfiable:
+        response.close()
+        return Response(status=416, headers={'Content-Range': f'bytes */{size}'})
+
+
+def _is_if_range_satisfied(request, response):
+    if_range = request.if_range
+    if if_range.etag:
+        return if_range.etag == response.get_etag()[0]
+    if if_range.date:
+        return response.last_modified is not None and response.last_modified <= if_range.date
+    return True
+
+
+def build_multipart_ranges_response(path, ranges, size, content_type, headers):
+    """Serve several byte ranges of a local file in a `multipart/byteranges` response.
+
+    :param path: path of the file, str
+    :param ranges: list of (start, stop) tuples of the Range header, as parsed by werkzeug
+    :param size: size of the file in bytes, int
+    :param content_type: content type of the file, str
+    :param headers: headers of the response, e.g. Content-Disposition and ETag
+    :return: Response
+    """
+    byte_ranges = []
+    for start, stop in ranges:
+        if start < 0:
+            start, stop = max(size + start, 0), size
+        else:
+            stop = size if stop is None else min(stop, size)
+        if start < stop:
+            byte_ranges.append((start, stop))
+
+    headers = {k: v for k, v in headers.items()
+               if k.lower() not in ('content-type', 'content-length', 'content-range')}
+    if not byte_ranges:
+        headers['Content-Range'] = f'bytes */{size}'
+        return Response(status=416, headers=headers)
+
+    boundary = uuid.uuid4().hex
+    chunk_size = get_config().download_chunk_size
+
+    def _generate():
+        with open(path, 'rb') as f:
+            for start, stop in byte_ranges:
+                yield (f'--{boundary}\r\nContent-Type: {content_type}\r\n'
+                       f'Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n').encode()
+                f.seek(start)
+                remaining = stop - start
+                while remaining > 0:
+                    chunk = f.read(min(chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
+                yield b'\r\n'
+        yield f'--{boundary}--\r\n'.encode()
+
+    headers['Accept-Ranges'] = 'bytes'
+    return Response(
+        _generate(),
+        206,
+        headers=headers,
+        content_type=f'multipart/byteranges; boundary={boundary}'
+    )
+
+
+def read_file_chunks(path, chunk_size):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            yield chunk
+
+
+def is_multi_file_index(index):
+    """Whether the `index` of a consume request selects several files, `all` or a comma
+    separated list of indices."""
+    index = str(index).strip().lower()
+    return index == 'all' or ',' in index
+
+
+def parse_file_indices(index, num_files):
+    """
+    :param index: `all` or a comma separated list of indices, str
+    :param num_files: number of files of the asset, int
+    :return: list of int
+    """
+    if index.strip().lower() == 'all':
+        return list(range(num_files))
+
+    indices = [int(i) for i in index.split(',') if i.strip()]
+    if not indices or any(not 0 <= i < num_files for i in indices):
+        raise ValueError(f'url index "{index}" is invalid.')
+    return indices
+
+
+def build_asset_archive_response(requests_session, asset, index, account, config_file):
+    """Stream a zip archive of several files of an asset.
+
+    The download urls are generated upfront, the files are then downloaded one after the
+    other while the archive is sent.
+
+    :param requests_session: requests.Session used to download the files
+    :param asset: DDO instance
+    :param index: `all` or a comma separated list of indices, str
+    :param account: provider Account instance
+    :param config_file: path of the config file of the Osmosis drivers, str
+    :return: Response
+    """
+    config = get_config()
+    indices = parse_file_indices(index, len(get_asset_files_list(asset, account)))
+    urls = [get_asset_url_at_index(i, asset, account) for i in indices]
+    download_urls = generate_download_urls(urls, config_file, config.download_urls_concurrency)
+    files_meta = asset.metadata['main']['files']
+    files_attributes = [files_meta[i] if i < len(files_meta) else {} for i in indices]
+
+    def _files():
+        for url, download_url, file_attributes in zip(urls, download_urls, files_attributes):
+            content_type = file_attributes.get('contentType')
+            local_path = get_local_file_path(download_url, config.local_files_roots)
+            if local_path:
+                filename, _ = get_download_file_info(url, {}, content_type)
+                yield filename, read_file_chunks(local_path, config.download_chunk_size)
+                continue
+
+            response = requests_session.get(download_url, stream=True)
+            if response.status_code != 200:
+                response.close()
+                msg = f'Failed to download a file of asset {asset.did} for the archive, ' \
+                      f'status {response.status_code}.'
+                logger.error(msg)
+                raise ValueError(msg)
+
+            filename, _ = get_download_file_info(url, response.headers, content_type)
+            content = stream_response_content(response, config.download_chunk_size)
+            if config.consume_verify_checksum:
+                content = verify_content(
+                    content, file_attributes, url.split('?')[0], _checksum_stats)
+            yield filename, content
+
+    logger.info(f'Streaming an archive of {len(indices)} files of asset {asset.did}.')
+    return Response(
+        stream_zip_archive(_files()),
+        200,
+        headers={
+            "Content-Disposition": f'attachment;filename={remove_0x_prefix(asset.asset_id)}.zip',
+            "Access-Control-Expose-Headers": f'Content-Disposition'
+        },
+        content_type='application/zip'
+    )
+
+
+def get_local_file_path(download_url, allowed_roots):
+    """Return the local path of `download_url` if it is a file in one of `allowed_roots`.
+
+    :param download_url: `file://` url or absolute path of the file, str
+    :param allowed_roots: list of the directories local files can be served from
+    :return: real path of the file, or None if it is not an allowed local file
+    """
+    if not allowed_roots:
+        return None
+
+    parsed_url = urlparse(download_url)
+    if parsed_url.scheme == 'file' and parsed_url.netloc in ('', 'localhost'):
+        path = unquote(parsed_url.path)
+    elif not parsed_url.scheme and download_url.startswith('/'):
+        path = download_url
+    else:
+        return None
+
+    path = os.path.realpath(path)
+    for root in allowed_roots:
+        root = os.path.realpath(root)
+        if os.path.commonpath([root, path]) == root and os.path.isfile(path):
+            return path
+
+    return None
+
+
+def is_download_redirect_enabled(asset, config):
+    """Whether the downloads of `asset` are redirected to their pre-signed urls.
+
+    The `redirectDownload` flag of the asset's `additionalInformation` takes precedence
+    over the provider's `consume.redirect` option.
+
+    :param asset: DDO instance
+    :param config: Config instance
+    :return: bool
+    """
+    additional_information = (asset.metadata or {}).get('additionalInformation') or {}
+    redirect = additional_information.get('redirectDownload')
+    if redirect is None:
+        return config.consume_redirect
+    if isinstance(redirect, str):
+        return redirect.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(redirect)
+
+
+def get_redirect_url(url, config_file, config):
+    """Return a pre-signed url of `url` to redirect a consumer to, or None if the file must
+    be proxied.
+
+    The url is signed for this consumer only, it does not come from the signed url cache.
+    Urls without a known expiry (e.g. the IPFS gateway urls) never expire and are not handed
+    out, nor the urls valid for longer than `consume.redirect_max_ttl` seconds.
+
+    :param url: url of the asset file, str
+    :param config_file: path of the config file of the Osmosis drivers, str
+    :param config: Config instance
+    :return: str
+    """
+    download_url = get_download_url(url, config_file, use_cache=False)
+    expiry = get_signed_url_expiry(download_url)
+    if expiry is None:
+        logger.debug(f'The download url of {url.split("?")[0]} is not pre-signed, it is proxied.')
+        return None
+
+    ttl = expiry - datetime.now().timestamp()
+    if ttl > config.consume_redirect_max_ttl:
+        logger.debug(f'The download url of {url.split("?")[0]} is valid for {ttl:.0f} seconds, '
+                     f'more than {config.consume_redirect_max_ttl}, it is proxied.')
+        return None
+
+    return download_url
+
+
+def build_redirect_response(download_url, agreement_id, did, consumer_address, url):
+    """Redirect the consumer to the pre-signed `download_url`, recording the grant in the
+    `brizo.audit` log.
+    """
+    audit_logger.info(f'download url granted: agreementId={agreement_id}, did={did}, '
+                      f'consumer={consumer_address}, file={url.split("?")[0]}')
+    response = redirect(download_url, code=302)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def stream_response_content(response, chunk_size):
+    """Yield the content of a streamed `requests` response chunk by chunk.
+
+    The next chunk is only read from the upstream connection when the previous one has been
+    consumed by the WSGI server, so at most a few chunks are held in memory per download.
+    """
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if chunk:
+                yield chunk
+    finally:
+        response.close()
+
+
+def get_job_status_hub():
+    global _job_status_hub
+    if _job_status_hub is None:
+        config = get_config()
+        _job_status_hub = JobStatusHub(
+            config.compute_status_interval, config.compute_status_idle_timeout,
+            config.compute_status_max_watchers, config.compute_status_max_watchers_per_owner)
+
+    return _job_status_hub
+
+
+def get_files_cache():
+    global _files_cache
+    if _files_cache is None:
+        config = get_config()
+        _files_cache = DecryptedFilesCache(
+            config.files_cache_size,
+            config.files_cache_ttl,
+            encrypt=config.files_cache_encrypt
+        )
+
+    return _files_cache
+
+
 def get_asset_files_list(asset, account):
     try:
-        files_str = do_secret_store_decrypt(
-            remove_0x_prefix(asset.asset_id),
+        files_str = get_files_cache().get_or_decrypt(
+            asset.did,
             asset.encrypted_files,
-            account,
-            get_config()
+            lambda: do_secret_store_decrypt(
+                remove_0x_prefix(asset.asset_id),
+                asset.encrypted_files,
+                account,
+                get_config()
+            )
         )
         logger.debug(f'Got decrypted files str {files_str}')
         files_list = json.loads(files_str)
@@ -366,7 +1190,6 @@ def get_asset_urls(asset, account, config_file):
     logger.debug(f'get_asset_urls(): did={asset.did}, provider={account.address}')
     try:
         files_list = get_asset_files_list(asset, account)
-        input_urls = []
         for i, file_meta_dict in enumerate(files_list):
             if not file_meta_dict or not isinstance(file_meta_dict, dict):
                 raise TypeError(f'Invalid file meta at index {i}, expected a dict, got a '
@@ -375,20 +1198,72 @@ def get_asset_urls(asset, account, config_file):
                 raise ValueError(f'The "url" key is not found in the '
                                  f'file dict {file_meta_dict} at index {i}.')
 
-            url = file_meta_dict['url']
-            input_urls.append(get_download_url(url, config_file))
-
-        return input_urls
+        return generate_download_urls(
+            [file_meta_dict['url'] for file_meta_dict in files_list],
+            config_file,
+            get_config().download_urls_concurrency
+        )
     except Exception as e:
         logger.error(f'Error decrypting urls for asset {asset.did}: {str(e)}')
         raise
 
 
-def get_download_url(url, config_file):
-    try:
+def generate_download_urls(urls, config_file, concurrency):
+    """Generate the download urls of `urls` with up to `concurrency` threads.
+
+    :param urls: list of urls of asset files, list of str
+    :param config_file: path of the config file of the Osmosis drivers, str
+    :param concurrency: max number of urls generated at the same time, int
+    :return: list of the download urls, in the order of `urls`
+    :raises ValueError: listing all the urls that failed
+    """
+    if concurrency <= 1 or len(urls) <= 1:
+        return [get_download_url(url, config_file) for url in urls]
+
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(urls))) as executor:
+        futures = [executor.submit(get_download_url, url, config_file) for url in urls]
+
+    errors = [f'index {i}: {future.exception()}'
+              for i, future in enumerate(futures) if future.exception() is not None]
+    if errors:
+        raise ValueError(f'Failed to generate the download url of {len(errors)} of '
+                         f'{len(urls)} files: ' + '; '.join(errors))
+
+    return [future.result() for future in futures]
+
+
+def warm_up_osmosis_drivers(config_file):
+    _osmosis_registry.warm_up(get_config().osmosis_warm_up_drivers, config_file)
+
+
+def get_signed_url_cache():
+    global _signed_url_cache
+    if _signed_url_cache is None:
+        config = get_config()
+        _signed_url_cache = SignedUrlCache(
+            config.signed_url_cache_size, config.signed_url_cache_margin)
+
+    return _signed_url_cache
+
+
+def get_download_url(url, config_file, use_cache=True):
+    """Return the url the file `url` is downloaded from, e.g. a pre-signed url.
+
+    :param url: url of the asset file, str
+    :param config_file: path of the config file of the Osmosis drivers, str
+    :param use_cache: whether the url may come from the signed url cache, bool
+    :return: str
+    """
+    def _generate_url(_url):
         logger.info('Connecting through Osmosis to generate the signed url.')
-        osm = Osmosis(url, config_file)
-        download_url = osm.data_plugin.generate_url(url)
+        data_plugin = _osmosis_registry.get_data_plugin(_url, config_file)
+        return data_plugin.generate_url(_url)
+
+    try:
+        if use_cache:
+            download_url = get_signed_url_cache().get_or_sign(url, _generate_url)
+        else:
+            download_url = _generate_url(url)
         logger.debug(f'Osmosis generated the url: {download_url}')
         return download_url
     except Exception as e:
@@ -428,10 +1303,13 @@ def validate_algorithm_dict(algorithm_dict, algorithm_did):
     return None, None
 
 
-def build_stage_algorithm_dict(algorithm_did, algorithm_meta, provider_account):
+def build_stage_algorithm_dict(algorithm_did, algorithm_meta, provider_account, context=None):
     if algorithm_did is not None:
         # use the DID
-        algo_asset = DIDResolver(keeper_instance().did_registry).resolve(algorithm_did)
+        if context:
+            algo_asset = context.resolve_asset(algorithm_did)
+        else:
+            algo_asset = resolve_asset(algorithm_did, keeper_instance())
         algo_id = algorithm_did
         raw_code = ''
         algo_url = get_asset_url_at_index(0, algo_asset, provider_account)
@@ -450,8 +1328,8 @@ def build_stage_algorithm_dict(algorithm_did, algorithm_meta, provider_account):
     })
 
 
-def build_stage_output_dict(output_def, asset, owner, provider_account):
-    config = get_config()
+def build_stage_output_dict(output_def, asset, owner, provider_account, context=None):
+    config = context.config if context else get_config()
     service_endpoint = asset.get_service(ServiceTypes.CLOUD_COMPUTE).service_endpoint
     if BaseURLs.ASSETS_URL in service_endpoint:
         service_endpoint = service_endpoint.split(BaseURLs.ASSETS_URL)[0]
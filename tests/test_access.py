@@ -3,6 +3,7 @@
 
 import json
 import mimetypes
+import os
 import time
 from copy import deepcopy
 from datetime import datetime
@@ -10,8 +11,11 @@ from unittest.mock import Mock, MagicMock
 import uuid
 
 import pytest
+from eth_account import Account as EthAccount
 from eth_utils import add_0x_prefix
 from ocean_keeper import Keeper
+from ocean_keeper.account import Account
+from ocean_keeper.agreements.agreement_manager import AgreementValues
 from ocean_keeper.utils import add_ethereum_prefix_and_hash_msg
 from ocean_utils.agreements.service_agreement import ServiceAgreement
 from ocean_utils.agreements.service_factory import ServiceFactory
@@ -22,21 +26,44 @@ from werkzeug.utils import get_content_type
 
 from ocean_utils.did import DID, did_to_id
 
+from brizo.agreement_index import AgreementActorsIndex
+from brizo.cache import TTLCache
+from brizo.config import Config
 from brizo.constants import BaseURLs
 from brizo.exceptions import InvalidSignatureError, ServiceAgreementExpired
+from brizo.myapp import app
+from brizo.osmosis_registry import OsmosisDriverRegistry
+from brizo.request_context import RequestContext
 from brizo.util import (
+    _read_agreement_authorization,
     check_auth_token,
     do_secret_store_decrypt,
     generate_token,
+    get_agreement_authorization,
     get_config,
+    get_ddo_cache,
     get_provider_account,
+    get_redirect_url,
+    get_signature_backend,
+    stream_response_content,
     is_token_valid,
+    reload_config,
+    sign_hash,
+    unlock_provider_key,
+    resolve_asset,
     keeper_instance,
     verify_signature,
     web3,
     build_download_response,
+    get_agreement_actors,
+    generate_download_urls,
     get_download_url,
     get_latest_keeper_version,
+    get_local_file_path,
+    is_block_final,
+    is_download_redirect_enabled,
+    is_multi_file_index,
+    parse_file_indices,
     validate_agreement_expiry)
 from tests.conftest import get_sample_ddo
 from tests.test_helpers import (
@@ -209,6 +236,51 @@ def test_auth_token():
         assert False, f'invalid signature/auth-token {token}, {pub_address}, {doc_id}: {e}'
 
 
+def test_auth_token_is_cached(monkeypatch):
+    consumer = get_consumer_account()
+    token = generate_token(consumer)
+    backend = get_signature_backend()
+    recover = backend.personal_recover
+    recovered = []
+
+    def _recover(message, signature):
+        recovered.append(signature)
+        return recover(message, signature)
+
+    monkeypatch.setattr(backend, 'personal_recover', _recover)
+    assert check_auth_token(token) == consumer.address
+    assert check_auth_token(token) == consumer.address
+    assert len(recovered) == 1
+
+    # an expired token is rejected even when its address is cached
+    monkeypatch.setattr(Config, 'auth_token_expiration', property(lambda self: '0'))
+    time.sleep(1.1)
+    assert check_auth_token(token) == '0x0'
+
+
+def test_unlock_provider_key(monkeypatch):
+    private_key = os.urandom(32)
+    address = EthAccount.privateKeyToAccount(private_key).address
+    encrypted_key = json.dumps(EthAccount.encrypt(private_key, 'secret'))
+    account = Account(address, 'secret', encrypted_key=encrypted_key)
+    msg_hash = add_ethereum_prefix_and_hash_msg('message')
+    expected = EthAccount.signHash(msg_hash, private_key).signature.hex()
+
+    monkeypatch.setattr('brizo.util._provider_signer', None)
+    unlock_provider_key(account)
+    decrypt = MagicMock(side_effect=EthAccount.decrypt)
+    monkeypatch.setattr(EthAccount, 'decrypt', decrypt)
+    assert sign_hash(msg_hash, account) == expected
+    assert sign_hash(msg_hash, account) == expected
+    decrypt.assert_not_called()
+    # the password is kept for the SecretStore
+    assert account.password == 'secret'
+
+    with pytest.raises(AssertionError):
+        unlock_provider_key(Account(get_consumer_account().address, 'secret',
+                                    encrypted_key=encrypted_key))
+
+
 def test_exec_endpoint():
     pass
 
@@ -231,12 +303,15 @@ def test_download_ipfs_file(client):
 def test_build_download_response():
     request = Mock()
     request.range = None
+    request.headers = {}
 
     class Dummy:
         pass
 
     mocked_response = Dummy()
     mocked_response.content = b'asdsadf'
+    mocked_response.iter_content = lambda chunk_size: iter([mocked_response.content])
+    mocked_response.close = lambda: None
     mocked_response.status_code = 200
     mocked_response.headers = {}
 
@@ -249,6 +324,8 @@ def test_build_download_response():
     response = build_download_response(request, requests_session, url, url, None)
     assert response.headers["content-type"] == content_type
     assert response.headers.get_all('Content-Disposition')[0] == f'attachment;filename={filename}'
+    assert response.is_streamed
+    assert response.data == mocked_response.content
 
     filename = '<<filename>>'
     url = f'https://source-lllllll.cccc/{filename}'
@@ -288,6 +365,56 @@ def test_build_download_response():
     assert response.headers.get_all('Content-Disposition')[0] == f'attachment;filename={filename}'
 
 
+def test_build_download_response_range():
+    request = Mock()
+    request.range = Mock()
+    request.headers = {'Range': 'bytes=0-1', 'If-Range': '"etag"'}
+
+    class Dummy:
+        pass
+
+    mocked_response = Dummy()
+    mocked_response.iter_content = lambda chunk_size: iter([b'as'])
+    mocked_response.close = lambda: None
+    mocked_response.status_code = 206
+    mocked_response.headers = {
+        'content-type': 'text/csv',
+        'content-range': 'bytes 0-1/7',
+        'content-length': '2',
+        'etag': '"etag"'
+    }
+    requests_session = Dummy()
+    requests_session.get = MagicMock(return_value=mocked_response)
+
+    url = 'https://source-lllllll.cccc/filename.csv'
+    response = build_download_response(request, requests_session, url, url, None)
+    upstream_headers = requests_session.get.call_args[1]['headers']
+    assert upstream_headers['Range'] == 'bytes=0-1' and upstream_headers['If-Range'] == '"etag"'
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == 'bytes 0-1/7'
+    assert response.headers['ETag'] == '"etag"'
+    assert response.headers['Content-Disposition'] == 'attachment;filename=filename.csv'
+    assert response.data == b'as'
+
+    mocked_response.status_code = 304
+    mocked_response.iter_content = lambda chunk_size: iter([])
+    mocked_response.headers = {'etag': '"etag"'}
+    request.range = None
+    request.headers = {'If-None-Match': '"etag"'}
+    response = build_download_response(request, requests_session, url, url, None)
+    assert response.status_code == 304
+
+
+def test_stream_response_content():
+    upstream = MagicMock()
+    upstream.iter_content = MagicMock(return_value=iter([b'ab', b'', b'cd']))
+    chunks = stream_response_content(upstream, 2)
+    upstream.close.assert_not_called()
+    assert list(chunks) == [b'ab', b'cd']
+    upstream.iter_content.assert_called_once_with(chunk_size=2)
+    upstream.close.assert_called_once()
+
+
 def test_latest_keeper_version():
     version = get_latest_keeper_version()
     assert version.startswith('v') and len(version.split('.')) == 3, ''
@@ -307,3 +434,290 @@ def test_agreement_expiry():
     time.sleep(3)
     with pytest.raises(ServiceAgreementExpired):
         validate_agreement_expiry(agreement, start_time)
+
+
+def test_agreement_actors_index(tmp_path):
+    pub_acc = get_publisher_account()
+    cons_acc = get_consumer_account()
+    keeper = keeper_instance()
+    ddo = get_dataset_ddo_with_access_service(pub_acc, providers=[pub_acc.address])
+    agreement_id = place_order(pub_acc, ddo, cons_acc, ServiceTypes.ASSET_ACCESS)
+    event = keeper.agreement_manager.subscribe_agreement_created(
+        agreement_id, 15, None, (), wait=True, from_block=0
+    )
+    assert event, "Agreement event is not found, check the keeper node's logs"
+
+    actors_index = AgreementActorsIndex(str(tmp_path / 'actors.db'), confirmations=0)
+    actors = actors_index.get_actors(keeper, agreement_id)
+    assert cons_acc.address in actors
+    assert sorted(actors) == sorted(get_agreement_actors(keeper, agreement_id))
+
+    # served from the index once the agreement block is indexed
+    agreement_block = keeper.agreement_manager.get_agreement(agreement_id).block_number_updated
+    assert actors_index.sync(keeper, web3().eth.blockNumber) >= agreement_block
+    assert sorted(actors_index.get_actors(keeper, agreement_id)) == sorted(actors)
+    assert actors_index.get_actors(keeper, '0x' + '00' * 32) == []
+
+
+def test_get_config_is_cached():
+    config = get_config()
+    assert get_config() is config
+    with pytest.raises(TypeError):
+        config.set('resources', 'brizo.url', 'http://localhost:8031')
+
+    # the components built from the config are built again from the new one
+    signature_backend = get_signature_backend()
+    ddo_cache = get_ddo_cache()
+    reload_config()
+    assert get_config() is not config
+    assert get_config().keeper_url == config.keeper_url
+    assert get_signature_backend() is not signature_backend
+    assert get_ddo_cache() is not ddo_cache
+
+
+def test_resolve_asset_is_cached():
+    pub_acc = get_publisher_account()
+    keeper = keeper_instance()
+    ddo = get_dataset_ddo_with_access_service(pub_acc, providers=[pub_acc.address])
+    asset = resolve_asset(ddo.did, keeper)
+    assert asset.did == ddo.did
+    assert resolve_asset(ddo.did, keeper) is asset
+
+
+def test_agreement_authorization_is_cached(monkeypatch):
+    pub_acc = get_publisher_account()
+    ddo = get_dataset_ddo_with_access_service(pub_acc, providers=[pub_acc.address])
+    agreement_id = add_0x_prefix(uuid.uuid4().hex + uuid.uuid4().hex)
+    consumer_address = get_consumer_account().address
+    agreement = AgreementValues(
+        add_0x_prefix(did_to_id(ddo.did)), pub_acc.address, '0x0', [], pub_acc.address, 1)
+
+    reads = []
+
+    def _read(_keeper, _agreement_id, *_):
+        reads.append(_agreement_id)
+        return agreement, len(reads) > 1, int(datetime.now().timestamp())
+
+    monkeypatch.setattr('brizo.util._read_agreement_authorization', _read)
+    monkeypatch.setattr('brizo.util.resolve_asset', lambda did, keeper: ddo)
+
+    # denied authorizations are cached for a short time only
+    args = (None, agreement_id, consumer_address, ServiceTypes.ASSET_ACCESS)
+    assert get_agreement_authorization(*args)[1] is False
+    assert get_agreement_authorization(*args)[1] is False
+    assert len(reads) == 1
+    time.sleep(get_config().authorization_cache_negative_ttl + 0.1)
+
+    # granted authorizations are cached until the agreement expires
+    assert get_agreement_authorization(*args)[1] is True
+    assert get_agreement_authorization(*args)[1] is True
+    assert len(reads) == 2
+    assert get_agreement_authorization(
+        None, agreement_id, consumer_address, ServiceTypes.CLOUD_COMPUTE)[1] is True
+    assert len(reads) == 3
+
+
+def test_final_block_time_is_cached(monkeypatch):
+    agreement_id = add_0x_prefix(uuid.uuid4().hex + uuid.uuid4().hex)
+    consumer_address = get_consumer_account().address
+    chain = {'latest_block': 100}
+    requested = []
+
+    class _Batch:
+        def __init__(self, *args):
+            self._calls = []
+
+        def add(self, method, params, decoder=None):
+            self._calls.append(method)
+            return len(self._calls) - 1
+
+        def add_contract_call(self, contract, fn_name, *args):
+            return self.add(fn_name, args)
+
+        def execute(self):
+            requested.extend(self._calls)
+            results = {
+                'getAgreement': (bytes(32), '0x0', bytes(32), [], '0x0', 90),
+                'eth_blockNumber': chain['latest_block'],
+                'checkPermissions': True,
+                'eth_getBlockByNumber': 1500000000,
+            }
+            calls, self._calls = self._calls, []
+            return [results[method] for method in calls]
+
+    monkeypatch.setattr('brizo.util.JsonRpcBatch', _Batch)
+    monkeypatch.setattr('brizo.util._block_times', TTLCache(10, 3600))
+    monkeypatch.setattr(
+        'brizo.util.get_agreement_actors', lambda *args: [consumer_address])
+    confirmations = get_config().block_confirmations
+    args = (MagicMock(), agreement_id, consumer_address, ServiceTypes.ASSET_ACCESS,
+            get_config())
+
+    # the agreement block may still be reorganized, its time is read again each time
+    chain['latest_block'] = 90 + confirmations - 1
+    assert not is_block_final(90, chain['latest_block'])
+    for _ in range(2):
+        assert _read_agreement_authorization(*args)[1:] == (True, 1500000000)
+    assert requested.count('eth_getBlockByNumber') == 2
+
+    # once final, the block time is cached
+    requested.clear()
+    chain['latest_block'] = 90 + confirmations
+    assert is_block_final(90, chain['latest_block'])
+    for _ in range(2):
+        assert _read_agreement_authorization(*args)[1:] == (True, 1500000000)
+    assert requested.count('eth_getBlockByNumber') == 1
+    assert requested.count('checkPermissions') == 2
+
+
+def test_request_context(monkeypatch):
+    resolved = []
+
+    def _resolve(did, keeper):
+        resolved.append(did)
+        return Mock(did=did)
+
+    monkeypatch.setattr('brizo.request_context.resolve_asset', _resolve)
+    context = RequestContext()
+    assert context.keeper is context.keeper
+    assert context.config is get_config()
+
+    did = 'did:op:' + uuid.uuid4().hex
+    asset = context.resolve_asset(did)
+    assert context.resolve_asset(did) is asset
+    assert context.resolve_asset(did.upper().replace('DID:OP:', 'did:op:')) is asset
+    assert resolved == [did]
+    assert RequestContext().resolve_asset(did) is not asset
+
+
+def test_osmosis_driver_registry():
+    config_file = app.config['CONFIG_FILE']
+    registry = OsmosisDriverRegistry()
+    plugin = registry.get_data_plugin('https://example.com/file.csv', config_file)
+    assert plugin.type() == 'On premise'
+    assert registry.get_data_plugin('http://example.net/other.csv', config_file) is plugin
+    assert registry.get_data_plugin('ipfs://QmQfpdcMWnLTXKKW9GPV7NgtEugghgD6HgzSF6gSrp2mL9') is not plugin
+
+    registry.warm_up(['ipfs', 'unknown_driver'])
+    registry.clear()
+    assert registry.get_data_plugin('https://example.com/file.csv', config_file) is not plugin
+
+
+def test_generate_download_urls():
+    config_file = app.config['CONFIG_FILE']
+    urls = [f'https://example.com/file{i}.csv' for i in range(20)]
+    assert generate_download_urls(urls, config_file, 8) == urls
+    assert generate_download_urls(urls, config_file, 1) == urls
+
+    with pytest.raises(ValueError) as e:
+        generate_download_urls(urls[:3] + [None, None], config_file, 4)
+    assert 'index 3' in str(e.value) and 'index 4' in str(e.value)
+
+
+def test_is_download_redirect_enabled():
+    config = Mock(consume_redirect=False)
+    asset = Mock(metadata={'main': {}, 'additionalInformation': {}})
+    assert is_download_redirect_enabled(asset, config) is False
+    config.consume_redirect = True
+    assert is_download_redirect_enabled(asset, config) is True
+
+    asset.metadata['additionalInformation']['redirectDownload'] = False
+    assert is_download_redirect_enabled(asset, config) is False
+    config.consume_redirect = False
+    asset.metadata['additionalInformation']['redirectDownload'] = 'true'
+    assert is_download_redirect_enabled(asset, config) is True
+
+
+def test_get_redirect_url(monkeypatch):
+    signed_urls = []
+
+    def generate_url(url):
+        if url.startswith('ipfs://'):
+            return 'https://gateway.ipfs.io/ipfs/' + url[len('ipfs://'):]
+        signed_at = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+        signed_url = f'{url}?X-Amz-Date={signed_at}&X-Amz-Expires=86400&n={len(signed_urls)}'
+        signed_urls.append(signed_url)
+        return signed_url
+
+    monkeypatch.setattr(
+        'brizo.util._osmosis_registry.get_data_plugin',
+        lambda url, config_file: Mock(generate_url=generate_url))
+    config = Mock(consume_redirect_max_ttl=24 * 3600)
+    url = 'https://bucket.s3.amazonaws.com/file.csv'
+
+    # each consumer gets its own signed url, not the cached one
+    assert get_redirect_url(url, None, config) == signed_urls[-1]
+    assert get_redirect_url(url, None, config) == signed_urls[-1]
+    assert len(set(signed_urls)) == 2
+    # the urls that never expire or that are valid for too long are proxied
+    assert get_redirect_url('ipfs://QmQfpdcMWnLTXKKW9GPV7NgtEugghgD6HgzSF6gSrp2mL9', None,
+                            config) is None
+    config.consume_redirect_max_ttl = 3600
+    assert get_redirect_url(url, None, config) is None
+
+
+def test_get_local_file_path(tmp_path):
+    root = tmp_path / 'data'
+    root.mkdir()
+    (root / 'file.csv').write_text('a,b')
+    (tmp_path / 'secret.txt').write_text('secret')
+    roots = [str(root)]
+    file_path = str(root / 'file.csv')
+
+    assert get_local_file_path(f'file://{file_path}', roots) == os.path.realpath(file_path)
+    assert get_local_file_path(file_path, roots) == os.path.realpath(file_path)
+    assert get_local_file_path(file_path, []) is None
+    assert get_local_file_path(f'{root}/../secret.txt', roots) is None
+    assert get_local_file_path(str(tmp_path / 'secret.txt'), roots) is None
+    assert get_local_file_path(f'{root}/missing.csv', roots) is None
+    assert get_local_file_path('https://example.com/mnt/data/file.csv', roots) is None
+
+
+def test_consume_url_is_not_served_from_local_files(client, monkeypatch, tmp_path):
+    (tmp_path / 'file.csv').write_text('secret')
+    monkeypatch.setattr(Config, 'local_files_roots', property(lambda self: [str(tmp_path)]))
+
+    pub_acc = get_publisher_account()
+    ddo = get_dataset_ddo_with_access_service(pub_acc, providers=[pub_acc.address])
+    agreement_id = add_0x_prefix(uuid.uuid4().hex + uuid.uuid4().hex)
+    agreement = AgreementValues(
+        add_0x_prefix(did_to_id(ddo.did)), pub_acc.address, '0x0', [], pub_acc.address, 1)
+    authorization = (agreement, True, int(datetime.now().timestamp()))
+    monkeypatch.setattr(
+        RequestContext, 'get_agreement_authorization', lambda self, *args: authorization)
+    monkeypatch.setattr(RequestContext, 'resolve_asset', lambda self, did: ddo)
+
+    # the url of the consumer is not verified, it must never be read from the disk
+    for url in (f'file://{tmp_path}/file.csv', f'{tmp_path}/file.csv'):
+        response = client.get(SERVICE_ENDPOINT, query_string={
+            'serviceAgreementId': agreement_id,
+            'consumerAddress': get_consumer_account().address,
+            'url': url
+        })
+        assert response.status_code != 200
+        assert b'secret' not in response.data
+
+
+def test_consume_invalid_session_token(client, monkeypatch):
+    monkeypatch.setattr(Config, 'session_token_ttl', property(lambda self: 60))
+    monkeypatch.setattr(Config, 'session_token_secret', property(lambda self: 'secret'))
+    agreement_id = add_0x_prefix(uuid.uuid4().hex + uuid.uuid4().hex)
+    response = client.get(SERVICE_ENDPOINT, query_string={
+        'serviceAgreementId': agreement_id,
+        'consumerAddress': get_consumer_account().address,
+        'sessionToken': f'did:op:{uuid.uuid4().hex}.{int(time.time()) + 60}.invalid',
+        'index': 0
+    })
+    assert response.status_code == 401
+
+
+def test_parse_file_indices():
+    assert is_multi_file_index('all') and is_multi_file_index('0,2')
+    assert not is_multi_file_index('1') and not is_multi_file_index(1)
+    assert parse_file_indices('all', 3) == [0, 1, 2]
+    assert parse_file_indices('2, 0', 3) == [2, 0]
+    with pytest.raises(ValueError):
+        parse_file_indices('0,3', 3)
+    with pytest.raises(ValueError):
+        parse_file_indices(',', 3)
+
@@ -0,0 +1,76 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from web3 import Web3
+
+from brizo import agreement_index
+from brizo.agreement_index import AgreementActorsIndex
+
+AGREEMENT_ID = '0x' + '11' * 32
+ACTOR = '0x00Bd138aBD70e2F00903268F3Db08f2D25677C9e'
+
+
+def _patch_web3(monkeypatch, latest_block):
+    w3 = MagicMock()
+    w3.toBytes = Web3.toBytes
+    w3.toHex = Web3.toHex
+    w3.eth.blockNumber = latest_block
+    monkeypatch.setattr(agreement_index.Web3Provider, 'get_web3', lambda: w3)
+    return w3
+
+
+def _keeper(logs):
+    keeper = MagicMock()
+    keeper.agreement_manager.address = '0x' + '33' * 20
+    keeper.agreement_manager.get_event_filter_for_agreement_actor.return_value.\
+        get_all_entries.return_value = logs
+    return keeper
+
+
+def test_agreement_actors_index_sync(monkeypatch, tmp_path):
+    _patch_web3(monkeypatch, 100)
+    log = SimpleNamespace(
+        args=SimpleNamespace(agreementId=Web3.toBytes(hexstr=AGREEMENT_ID), actor=ACTOR),
+        blockNumber=50)
+    keeper = _keeper([log])
+    actors_index = AgreementActorsIndex(
+        str(tmp_path / 'actors.db'), confirmations=6, max_sync_blocks=60)
+
+    assert actors_index.sync(keeper, 100) == 59
+    assert actors_index.sync(keeper, 100) == 94
+    assert actors_index.sync(keeper, 100) == 94
+    keeper.agreement_manager.get_event_filter_for_agreement_actor.assert_called_with(
+        None, from_block=60, to_block=94)
+
+    # an indexed agreement is found without reading the chain
+    monkeypatch.setattr(agreement_index, 'EventFilter', MagicMock(side_effect=AssertionError))
+    assert actors_index.get_actors(keeper, AGREEMENT_ID) == [ACTOR]
+
+
+def test_agreement_actors_index_scans_the_blocks_not_indexed(monkeypatch, tmp_path):
+    _patch_web3(monkeypatch, 25000)
+    log = SimpleNamespace(args=SimpleNamespace(actor=ACTOR))
+    scanned = []
+
+    def event_filter(event_name, event, argument_filters, from_block, to_block):
+        scanned.append((from_block, to_block))
+        entries = [log] if from_block <= 50 <= to_block else []
+        return MagicMock(get_all_entries=MagicMock(return_value=entries))
+
+    monkeypatch.setattr(agreement_index, 'EventFilter', event_filter)
+    keeper = _keeper([])
+    actors_index = AgreementActorsIndex(
+        str(tmp_path / 'actors.db'), max_sync_blocks=1000000, scan_chunk_blocks=10000)
+
+    # the index was not synced, the whole chain is scanned from the latest block back
+    assert actors_index.get_actors(keeper, AGREEMENT_ID) == [ACTOR]
+    assert scanned == [(15001, 25000), (5001, 15000), (0, 5000)]
+
+    # the scan stops once the actors are found or at the last indexed block
+    scanned.clear()
+    assert actors_index.sync(keeper, 24900) == 24894
+    assert actors_index.get_actors(keeper, AGREEMENT_ID) == []
+    assert scanned == [(24895, 25000)]
@@ -0,0 +1,33 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import io
+import zipfile
+
+from brizo.archive import get_member_name, stream_zip_archive
+
+
+def test_stream_zip_archive():
+    files = [
+        ('file.csv', iter([b'a' * 100000, b'b'])),
+        ('file.csv', iter([b'c'])),
+        ('empty.txt', iter([]))
+    ]
+    archive = zipfile.ZipFile(io.BytesIO(b''.join(stream_zip_archive(files))))
+    assert archive.testzip() is None
+    assert archive.namelist() == ['file.csv', '1-file.csv', 'empty.txt']
+    assert archive.read('file.csv') == b'a' * 100000 + b'b'
+    assert archive.read('1-file.csv') == b'c'
+
+
+def test_stream_zip_archive_member_names():
+    assert get_member_name('file.csv', 0) == 'file.csv'
+    assert get_member_name('../../.bashrc', 0) == 'bashrc'
+    assert get_member_name('/etc/passwd', 0) == 'passwd'
+    assert get_member_name('..\\..\\evil.exe', 0) == 'evil.exe'
+    assert get_member_name('..', 3) == 'file-3'
+    assert get_member_name(None, 4) == 'file-4'
+
+    files = [('../../.bashrc', iter([b'a'])), ('dir/', iter([b'b']))]
+    archive = zipfile.ZipFile(io.BytesIO(b''.join(stream_zip_archive(files))))
+    assert archive.namelist() == ['bashrc', 'file-1']
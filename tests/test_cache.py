@@ -0,0 +1,157 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from brizo.cache import TTLCache
+from brizo.content_cache import ContentCache
+from brizo.files_cache import DecryptedFilesCache
+from brizo.signed_url_cache import SignedUrlCache, get_signed_url_expiry
+
+
+def test_ttl_cache_expiry_and_lru_eviction():
+    cache = TTLCache(2, 0.2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert 'b' not in cache, 'least recently used entry should be evicted'
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+    cache.set('d', 4, ttl=10)
+    time.sleep(0.3)
+    assert cache.get('c') is None
+    assert cache.get('d') == 4
+
+
+def test_ttl_cache_get_or_load_single_flight():
+    cache = TTLCache(10, 10)
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('k', load)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == ['value'] * 8
+    assert cache.get_or_load('k', load) == 'value' and len(calls) == 1
+
+
+def test_ttl_cache_get_or_load_errors_and_ttl():
+    cache = TTLCache(10, 10)
+    with pytest.raises(ZeroDivisionError):
+        cache.get_or_load('k', lambda: 1 / 0)
+    assert 'k' not in cache
+
+    assert cache.get_or_load('none', lambda: None, ttl=lambda v: None if v else 0) is None
+    assert 'none' not in cache
+
+    def load_and_invalidate():
+        cache.pop('stale')
+        return 'old'
+
+    assert cache.get_or_load('stale', load_and_invalidate) == 'old'
+    assert 'stale' not in cache
+
+
+@pytest.mark.parametrize('encrypt', [True, False])
+def test_decrypted_files_cache(encrypt):
+    cache = DecryptedFilesCache(10, 10, encrypt=encrypt)
+    files = '[{"url": "https://example.com/data.csv"}]'
+    calls = []
+
+    def decrypt():
+        calls.append(1)
+        return files
+
+    assert cache.get_or_decrypt('did:op:0123', '0xaaaa', decrypt) == files
+    assert cache.get_or_decrypt('did:op:0123', '0xaaaa', decrypt) == files
+    assert len(calls) == 1
+
+    # a new encrypted files list for the same did is decrypted again
+    assert cache.get_or_decrypt('did:op:0123', '0xbbbb', decrypt) == files
+    assert len(calls) == 2
+
+    cached_values = [value for value, _ in cache._cache._entries.values()]
+    assert (files in cached_values) is not encrypt
+
+
+def test_get_signed_url_expiry():
+    azure_url = ('https://account.blob.core.windows.net/container/file.csv?se=2020-01-02T03%3A04%3A05Z'
+                 '&sp=r&sv=2018-03-28&sr=b&sig=abc')
+    assert get_signed_url_expiry(azure_url) == 1577934245
+    aws_v4_url = ('https://bucket.s3.amazonaws.com/file.csv?X-Amz-Algorithm=AWS4-HMAC-SHA256'
+                  '&X-Amz-Date=20200102T030405Z&X-Amz-Expires=86400&X-Amz-Signature=abc')
+    assert get_signed_url_expiry(aws_v4_url) == 1577934245 + 86400
+    aws_v2_url = 'https://bucket.s3.amazonaws.com/file.csv?AWSAccessKeyId=key&Expires=1577934245'
+    assert get_signed_url_expiry(aws_v2_url) == 1577934245
+    assert get_signed_url_expiry('https://example.com/file.csv') is None
+    assert get_signed_url_expiry('https://example.com/file.csv?se=tomorrow') is None
+
+
+def test_signed_url_cache():
+    expiry = (datetime.utcnow() + timedelta(hours=2)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    signed = []
+
+    def sign(url):
+        signed.append(url)
+        return f'{url}?se={expiry}&sig={len(signed)}'
+
+    cache = SignedUrlCache(10, 3600)
+    url = 'https://account.blob.core.windows.net/container/file.csv'
+    assert cache.get_or_sign(url, sign) == cache.get_or_sign(url, sign)
+    assert len(signed) == 1
+    assert cache.stats()['hits'] == 1
+
+    # urls expiring within the margin and urls without expiry are not cached
+    cache = SignedUrlCache(10, 3 * 3600)
+    cache.get_or_sign(url, sign)
+    cache.get_or_sign(url, sign)
+    assert len(signed) == 3
+    cache.get_or_sign('https://example.com/file.csv', lambda u: u)
+    assert cache.stats()['size'] == 0
+
+
+def test_content_cache(tmp_path):
+    cache = ContentCache(str(tmp_path), 10)
+    metadata = {'etag': '"abc"', 'content_type': 'text/csv', 'filename': 'file.csv'}
+    assert cache.get('https://example.com/a') is None
+    assert cache.can_cache({'etag': '"abc"', 'content-length': '10'})
+    assert not cache.can_cache({'etag': '"abc"', 'content-length': '11'})
+    assert not cache.can_cache({'content-length': '1'})
+
+    # an interrupted download is not cached
+    chunks = cache.stream_and_store('https://example.com/a', iter([b'12', b'34']), metadata)
+    assert next(chunks) == b'12'
+    chunks.close()
+    assert cache.get('https://example.com/a') is None
+
+    assert b''.join(cache.stream_and_store('https://example.com/a', [b'12', b'34'], metadata)) == b'1234'
+    cached = cache.get('https://example.com/a')
+    assert cached.size == 4 and cached.filename == 'file.csv'
+    assert cached.validation_headers() == {'If-None-Match': '"abc"'}
+    with open(cached.path, 'rb') as f:
+        assert f.read() == b'1234'
+
+    # files larger than the cache are not stored, the least recently used files are evicted
+    assert b''.join(cache.stream_and_store('https://example.com/b', [b'0' * 11], metadata)) == b'0' * 11
+    assert cache.get('https://example.com/b') is None
+    os.utime(cached.path, (1, 1))
+    b''.join(cache.stream_and_store('https://example.com/c', [b'0' * 8], metadata))
+    assert cache.get('https://example.com/a') is None
+    assert cache.get('https://example.com/c').size == 8
+    assert cache.stats()['files'] == 1 and cache.stats()['bytes'] == 8
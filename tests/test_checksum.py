@@ -0,0 +1,36 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+
+import pytest
+
+from brizo.checksum import (
+    ChecksumMismatchError, ChecksumStats, get_checksum_algorithm, verify_content)
+
+
+def test_get_checksum_algorithm():
+    assert get_checksum_algorithm('efb2c764274b745f5fc37f97c6b0e764') == 'md5'
+    assert get_checksum_algorithm('0x' + 'a' * 64) == 'sha256'
+    assert get_checksum_algorithm('abc', 'SHA-1') == 'sha1'
+    assert get_checksum_algorithm('abc') is None
+
+
+def test_verify_content():
+    stats = ChecksumStats()
+    file_attributes = {'checksum': hashlib.md5(b'abcd').hexdigest(), 'contentLength': '4'}
+    assert list(verify_content(iter([b'ab', b'cd']), file_attributes, 'file', stats)) == [
+        b'ab', b'cd']
+
+    # the last chunk is not passed on when the file does not match
+    chunks = verify_content(iter([b'ab', b'ce']), file_attributes, 'file', stats)
+    assert next(chunks) == b'ab'
+    with pytest.raises(ChecksumMismatchError):
+        next(chunks)
+
+    with pytest.raises(ChecksumMismatchError):
+        list(verify_content(iter([b'abcd']), {'contentLength': '5'}, 'file', stats))
+    assert list(verify_content(iter([b'ab']), {'contentLength': 'unknown'}, 'file', stats)) == [
+        b'ab']
+    assert list(verify_content(iter([]), {'contentLength': '0'}, 'file', stats)) == []
+    assert stats.stats() == {'verified': 2, 'mismatched': 2, 'skipped': 1}
@@ -0,0 +1,42 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import os
+
+import pytest
+from eth_account import Account
+from eth_keys.backends import is_coincurve_available
+
+from brizo.crypto import SignatureBackend, add_ethereum_prefix_and_hash
+
+BACKENDS = ['native'] + (['coincurve'] if is_coincurve_available() else [])
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_signature_backend(name):
+    backend = SignatureBackend(name)
+    account = Account.privateKeyToAccount(os.urandom(32))
+    message = 'Ocean Protocol Authentication\n1568372035'
+    msg_hash = add_ethereum_prefix_and_hash(message)
+
+    # same signatures and addresses as `Keeper.sign_hash` and `Keeper.ec_recover`
+    signature = backend.sign_hash(msg_hash, account.privateKey)
+    assert signature == Account.signHash(msg_hash, account.privateKey).signature.hex()
+    assert backend.personal_recover(message, signature) == account.address
+    assert backend.recover_hash(msg_hash.hex(), signature) == account.address
+    raw = bytes.fromhex(signature[2:])
+    assert backend.recover_hash(msg_hash, raw[:64] + bytes([raw[64] - 27])) == account.address
+
+    other = add_ethereum_prefix_and_hash('other message')
+    assert backend.batch_verify([
+        (msg_hash, signature, account.address),
+        (other, signature, account.address),
+        (msg_hash, '0x' + '00' * 65, account.address),
+        (msg_hash, '0x1234', account.address)
+    ]) == [True, False, False, False]
+
+
+def test_signature_backend_selection():
+    assert SignatureBackend('auto').name == BACKENDS[-1]
+    with pytest.raises(ValueError):
+        SignatureBackend('openssl')
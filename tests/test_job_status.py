@@ -0,0 +1,94 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import json
+import threading
+import time
+
+import pytest
+
+from brizo.job_status import JobStatusHub, TooManyWatchersError, get_status_version
+
+RUNNING = (200, [{'status': 10}])
+FINISHED = (200, [{'status': 70}])
+
+
+def _fetcher(statuses):
+    fetched = []
+
+    def _fetch():
+        fetched.append(1)
+        return statuses[min(len(fetched), len(statuses)) - 1]
+
+    return _fetch, fetched
+
+
+def test_job_status_hub():
+    fetch, fetched = _fetcher([RUNNING] * 3 + [FINISHED])
+    hub = JobStatusHub(interval=0.05, idle_timeout=0.2, max_watchers=10, max_watchers_per_owner=2)
+    running, finished = get_status_version(RUNNING), get_status_version(FINISHED)
+    results = []
+
+    def _wait():
+        results.append(hub.wait('owner', 'job', fetch, running, 5))
+
+    # the first status is fetched once for all the requests
+    assert hub.wait('owner', 'job', fetch, None, 5) == (running, RUNNING)
+    waiters = [threading.Thread(target=_wait) for _ in range(3)]
+    for waiter in waiters:
+        waiter.start()
+    for waiter in waiters:
+        waiter.join()
+    assert results == [(finished, FINISHED)] * 3
+    assert len(hub) == 1
+
+    # a request without change returns the current version after its timeout
+    assert hub.wait('owner', 'job', fetch, finished, 0.1) == (finished, FINISHED)
+
+    # the job is not watched anymore once it has no request
+    time.sleep(0.5)
+    assert len(hub) == 0
+    count = len(fetched)
+    time.sleep(0.2)
+    assert len(fetched) == count
+
+    # the versions do not depend on the watcher, a client with an older version gets the
+    # status of a new watcher right away
+    start = time.monotonic()
+    assert hub.wait('owner', 'job', fetch, running, 2) == (finished, FINISHED)
+    assert time.monotonic() - start < 1
+
+
+def test_job_status_hub_stream():
+    fetch, _ = _fetcher([FINISHED])
+    hub = JobStatusHub(interval=0.05, idle_timeout=0.2, max_watchers=10, max_watchers_per_owner=2)
+    version = get_status_version(FINISHED)
+
+    # a client resuming with the id of another status gets the current one first
+    events = list(hub.stream('owner', 'job', fetch, 'other', 0.3, heartbeat=0.1))
+    assert events[0].startswith(f'id: {version}\ndata: ')
+    assert json.loads(events[0].split('data: ')[1]) == {
+        'version': version, 'statusCode': 200, 'status': [{'status': 70}]}
+    assert set(events[1:]) == {': keep-alive\n\n'}
+
+    events = list(hub.stream('owner', 'job', fetch, version, 0.3, heartbeat=0.1))
+    assert set(events) == {': keep-alive\n\n'}
+
+
+def test_job_status_hub_max_watchers():
+    fetch, _ = _fetcher([RUNNING])
+    hub = JobStatusHub(interval=0.05, idle_timeout=0.2, max_watchers=3, max_watchers_per_owner=2)
+    hub.wait('owner', 'job-1', fetch, None, 1)
+    hub.wait('owner', 'job-2', fetch, None, 1)
+    # the jobs already watched are still available
+    hub.wait('owner', 'job-1', fetch, None, 1)
+    with pytest.raises(TooManyWatchersError):
+        hub.wait('owner', 'job-3', fetch, None, 1)
+
+    hub.wait('other', 'job-1', fetch, None, 1)
+    with pytest.raises(TooManyWatchersError):
+        hub.wait('third', 'job-1', fetch, None, 1)
+
+    time.sleep(0.5)
+    assert len(hub) == 0
+    hub.wait('owner', 'job-3', fetch, None, 1)
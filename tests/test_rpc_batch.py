@@ -0,0 +1,47 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from brizo.rpc_batch import JsonRpcBatch
+
+
+def _session(response_items):
+    session = MagicMock()
+    session.post.return_value.json.return_value = response_items
+    return session
+
+
+def test_json_rpc_batch_execute():
+    # responses may come back in any order
+    session = _session([
+        {'jsonrpc': '2.0', 'id': 1, 'result': {'timestamp': '0x10'}},
+        {'jsonrpc': '2.0', 'id': 0, 'result': '0x2a'},
+    ])
+    batch = JsonRpcBatch('http://localhost:8545', session)
+    block_number = batch.add('eth_blockNumber', [], decoder=lambda r: int(r, 16))
+    block = batch.add('eth_getBlockByNumber', ['0x1', False])
+    assert len(batch) == 2
+
+    results = batch.execute()
+    assert results[block_number] == 42
+    assert results[block] == {'timestamp': '0x10'}
+    assert len(batch) == 0
+
+    session.post.assert_called_once()
+    payload = session.post.call_args[1]['json']
+    assert [call['method'] for call in payload] == ['eth_blockNumber', 'eth_getBlockByNumber']
+
+
+def test_json_rpc_batch_error():
+    session = _session([
+        {'jsonrpc': '2.0', 'id': 0, 'error': {'code': -32000, 'message': 'boom'}},
+    ])
+    batch = JsonRpcBatch('http://localhost:8545', session)
+    batch.add('eth_call', [{}, 'latest'])
+    with pytest.raises(ValueError):
+        batch.execute()
+
+    assert JsonRpcBatch('http://localhost:8545', session).execute() == []
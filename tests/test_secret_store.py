@@ -0,0 +1,37 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import pytest
+
+from brizo import secret_store
+from brizo.secret_store import SecretStorePool
+
+
+class DummyClient:
+    def __init__(self, *args):
+        self.args = args
+
+
+def test_secret_store_pool(monkeypatch):
+    monkeypatch.setattr(secret_store, 'SessionSecretStoreClient', DummyClient)
+    pool = SecretStorePool('http://ss', 'http://parity', '0x1', 'password', size=2,
+                           timeout=0.1)
+
+    with pool.client() as first, pool.client() as second:
+        assert first is not second
+        assert first.args == ('http://ss', 'http://parity', '0x1', 'password')
+        # all the clients are busy, the third caller gives up after the timeout
+        with pytest.raises(TimeoutError):
+            with pool.client():
+                pass
+
+    # a released client is lent again instead of creating a new one
+    with pool.client() as client:
+        assert client in (first, second)
+
+    stats = pool.stats()
+    assert stats['size'] == 2
+    assert stats['clients'] == 2
+    assert stats['idle'] == 2
+    assert stats['acquired'] == 3
+    assert stats['max_wait'] < 0.1
@@ -0,0 +1,122 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from brizo.segmented_download import (
+    SegmentedDownload, SegmentedDownloadError, get_if_range_validator)
+
+CONTENT = bytes(range(256)) * 40
+URL = 'https://source-lllllll.cccc/filename.csv'
+
+
+def _response(status_code, headers, content=b''):
+    response = SimpleNamespace(
+        status_code=status_code,
+        headers=headers,
+        content=content,
+        iter_content=lambda chunk_size: iter([content]),
+        closed=False
+    )
+    response.close = lambda: setattr(response, 'closed', True)
+    return response
+
+
+def _get_range(validators, content=CONTENT):
+    responses = []
+
+    def get(url, headers, stream=False):
+        if 'Range' not in headers:
+            response = _response(200, dict(validators, **{
+                'accept-ranges': 'bytes',
+                'content-length': str(len(content))
+            }), content)
+        else:
+            start, stop = [int(i) for i in headers['Range'][len('bytes='):].split('-')]
+            stop = min(stop, len(content) - 1)
+            response = _response(206, dict(validators, **{
+                'content-range': f'bytes {start}-{stop}/{len(content)}',
+                'content-length': str(stop - start + 1)
+            }), content[start:stop + 1])
+        responses.append(response)
+        return response
+
+    get.responses = responses
+    return get
+
+
+def _read(download):
+    return b''.join(download.iter_content(512))
+
+
+def test_segmented_download():
+    session = MagicMock()
+    session.get.side_effect = _get_range({'etag': '"etag"'})
+    download = SegmentedDownload.open(session, URL, {}, 1000, 3, 5000)
+    assert download.status_code == 200
+    assert download.headers['Content-Length'] == str(len(CONTENT))
+    assert _read(download) == CONTENT
+    assert session.get.call_count == 11
+    assert 'Range' not in session.get.call_args_list[0][1]['headers']
+    assert session.get.call_args[1]['headers']['If-Range'] == '"etag"'
+    # the first segment is read from the full response, the rest of it is not downloaded
+    assert session.get.side_effect.responses[0].closed
+
+    # below the threshold the file is streamed from the first response
+    session.get.reset_mock()
+    response = SegmentedDownload.open(session, URL, {}, 1000, 3, 20000)
+    assert response.status_code == 200
+    assert _read(response) == CONTENT
+    assert session.get.call_count == 1
+
+
+def test_segmented_download_file_changed():
+    get = _get_range({'etag': '"etag"'})
+
+    def get_changed(url, headers, stream=False):
+        response = get(url, headers, stream)
+        if 'Range' in headers:
+            response.status_code = 200
+        return response
+
+    session = MagicMock()
+    session.get.side_effect = get_changed
+    download = SegmentedDownload.open(session, URL, {}, 1000, 3, 5000)
+    with pytest.raises(SegmentedDownloadError):
+        _read(download)
+
+
+def test_segmented_download_if_range_validator():
+    assert get_if_range_validator({'etag': '"etag"', 'last-modified': 'date'}) == '"etag"'
+    assert get_if_range_validator({'etag': 'W/"etag"', 'last-modified': 'date'}) == 'date'
+    assert get_if_range_validator({'etag': 'W/"etag"'}) is None
+    assert get_if_range_validator({}) is None
+
+    # a weak ETag would make the upstream ignore If-Range, the date is sent instead
+    session = MagicMock()
+    session.get.side_effect = _get_range(
+        {'etag': 'W/"etag"', 'last-modified': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+    download = SegmentedDownload.open(session, URL, {}, 1000, 3, 5000)
+    assert _read(download) == CONTENT
+    assert session.get.call_args[1]['headers']['If-Range'] == 'Wed, 21 Oct 2015 07:28:00 GMT'
+
+
+def test_segmented_download_fallbacks():
+    # an upstream without range support is streamed as is
+    full_response = _response(200, {'content-length': str(len(CONTENT))}, CONTENT)
+    session = MagicMock()
+    session.get.return_value = full_response
+    assert SegmentedDownload.open(session, URL, {'X-Header': 'a'}, 1000, 3, 5000) is \
+        full_response
+    assert session.get.call_args[1]['headers'] == {'X-Header': 'a'}
+
+    # as are the files without a size and the errors
+    for response in (_response(200, {'accept-ranges': 'bytes'}, CONTENT),
+                     _response(404, {'accept-ranges': 'bytes', 'content-length': '0'})):
+        session = MagicMock()
+        session.get.return_value = response
+        assert SegmentedDownload.open(session, URL, {}, 1000, 3, 5000) is response
+        assert session.get.call_count == 1
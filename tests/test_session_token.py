@@ -0,0 +1,38 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import time
+import uuid
+
+import pytest
+from eth_utils import add_0x_prefix
+
+from brizo.session_token import SessionTokenSigner
+
+CONSUMER_ADDRESS = '0x00Bd138aBD70e2F00903268F3Db08f2D25677C9e'
+OTHER_ADDRESS = '0x068Ed00cF0441e4829D9784fCBe7b9e26D4BD8d0'
+
+
+def test_session_token():
+    signer = SessionTokenSigner('secret')
+    agreement_id = add_0x_prefix(uuid.uuid4().hex + uuid.uuid4().hex)
+    did = 'did:op:' + uuid.uuid4().hex
+    token = signer.issue(agreement_id, CONSUMER_ADDRESS, did, time.time() + 60)
+
+    assert signer.verify(token, agreement_id, CONSUMER_ADDRESS) == did
+    assert signer.verify(token, agreement_id.upper(), CONSUMER_ADDRESS.lower()) == did
+    assert signer.verify(token, agreement_id, OTHER_ADDRESS) is None
+    assert signer.verify(token.replace(did, 'did:op:' + uuid.uuid4().hex),
+                         agreement_id, CONSUMER_ADDRESS) is None
+    assert SessionTokenSigner('other').verify(token, agreement_id, CONSUMER_ADDRESS) is None
+    assert SessionTokenSigner(b'secret').verify(token, agreement_id, CONSUMER_ADDRESS) == did
+    expired = signer.issue(agreement_id, CONSUMER_ADDRESS, did, time.time() - 1)
+    assert signer.verify(expired, agreement_id, CONSUMER_ADDRESS) is None
+    assert signer.verify('invalid', agreement_id, CONSUMER_ADDRESS) is None
+
+
+def test_session_token_requires_a_secret():
+    with pytest.raises(ValueError):
+        SessionTokenSigner(None)
+    with pytest.raises(ValueError):
+        SessionTokenSigner('')